@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""Measures the overhead of AdjFloat arithmetic relative to plain floats.
+
+Times `a*b + c` and `a*2.0 + 1.0` on plain floats, on AdjFloats with annotation
+paused, and on AdjFloats annotated on a tape. Each time is reported per operation,
+and as a multiple of the time of the same arithmetic on plain floats.
+"""
+from __future__ import print_function
+
+import timeit
+
+from pyadjoint.adjfloat import AdjFloat
+from pyadjoint.tape import Tape, set_working_tape, pause_annotation, continue_annotation
+
+number = 100000
+repeat = 5
+
+
+def best_time(statement, values, setup=None):
+    timer = timeit.Timer(statement, setup="from __main__ import values\na, b, c = values")
+    if setup is None:
+        return min(timer.repeat(repeat, number))/(2*number)
+    times = []
+    for _ in range(repeat):
+        setup()
+        times.append(timer.timeit(number))
+    return min(times)/(2*number)
+
+
+def new_tape():
+    # Keep the tape from growing over the repeats.
+    set_working_tape(Tape())
+
+
+statements = [("variables", "a*b + c"), ("constants", "a*2.0 + 1.0")]
+
+print("{:<12} {:<12} {:>12} {:>10}".format("operands", "mode", "time/op", "overhead"))
+for name, statement in statements:
+    values = [1.1, 0.7, 0.3]
+    reference = best_time(statement, values)
+
+    values = [AdjFloat(1.1), AdjFloat(0.7), AdjFloat(0.3)]
+    pause_annotation()
+    try:
+        unannotated = best_time(statement, values)
+    finally:
+        continue_annotation()
+
+    annotated = best_time(statement, values, setup=new_tape)
+
+    for mode, time in [("float", reference), ("unannotated", unannotated), ("annotated", annotated)]:
+        print("{:<12} {:<12} {:>10.3f}us {:>9.0f}x".format(name, mode, 1e6*time, time/reference))
@@ -2,12 +2,15 @@ import backend
 import ufl
 from pyadjoint.tape import get_working_tape, stop_annotating, annotate_tape, no_annotations
 from pyadjoint.block import Block
+from pyadjoint.profiling import count
 from .types import create_overloaded_object
+from .form_cache import FormCache
 
 
 def assemble(*args, **kwargs):
     annotate = annotate_tape(kwargs)
     with stop_annotating():
+        count("assemble")
         output = backend.assemble(*args, **kwargs)
     output = create_overloaded_object(output)
 
@@ -46,66 +49,105 @@ class AssembleBlock(Block):
     def __init__(self, form):
         super(AssembleBlock, self).__init__()
         self.form = form
+        self._form_cache = FormCache()
         for c in self.form.coefficients():
             self.add_dependency(c.get_block_output())
 
     def __str__(self):
         return str(self.form)
 
-    @no_annotations
-    def evaluate_adj(self):
-        #t = backend.Timer("Assemble:evaluate_adj")
-        adj_input = self.get_outputs()[0].get_adj_output()
-        if adj_input is None:
-            return
+    def _forms(self):
+        """Returns the form with the saved outputs substituted in, and the substitutions.
+
+        The forms derived from it are kept in the form cache of the block,
+        until the saved outputs change.
 
+        """
+        self._form_cache.update(self.get_dependencies())
+        return self._form_cache.get("form", self._replace_form)
+
+    def _replace_form(self):
         replaced_coeffs = {}
         for block_output in self.get_dependencies():
             coeff = block_output.get_output()
             replaced_coeffs[coeff] = block_output.get_saved_output()
 
-        form = backend.replace(self.form, replaced_coeffs)
-
+        return backend.replace(self.form, replaced_coeffs), replaced_coeffs
+
+    def _derivative(self, form, block_output, c_rep):
+        """Returns the derivative of the form with respect to a dependency, in the direction of
+        a TestFunction (Functions) or of 1 (Constants)."""
+        c = block_output.get_output()
+        if isinstance(c, backend.Function):
+            dc = backend.TestFunction(c.function_space())
+        elif isinstance(c, backend.Constant):
+            dc = backend.Constant(1)
+        return self._form_cache.get(("dform", block_output), lambda: backend.derivative(form, c_rep, dc))
+
+    def _expression_derivative(self, form, c, c_rep):
+        # Create a FunctionSpace from self.form and Expression.
+        # And then make a TestFunction from this space.
+        mesh = self.form.ufl_domain().ufl_cargo()
+        c_element = c.ufl_element()
+
+        # In newer versions of FEniCS there is a method named reconstruct, thus we may
+        # in the future just call c_element.reconstruct(cell=mesh.ufl_cell()).
+        element = ufl.FiniteElement(c_element.family(), mesh.ufl_cell(), c_element.degree())
+        V = backend.FunctionSpace(mesh, element)
+        dc = backend.TestFunction(V)
+
+        return backend.derivative(form, c_rep, dc), V
+
+    def get_adj_reads(self):
+        coefficients = set()
         for block_output in self.get_dependencies():
+            if not block_output.active:
+                continue
             c = block_output.get_output()
-            c_rep = replaced_coeffs.get(c, c)
-
             if isinstance(c, backend.Expression):
-                # Create a FunctionSpace from self.form and Expression.
-                # And then make a TestFunction from this space.
+                dform = self._expression_derivative(self.form, c, c)[0]
+            elif isinstance(c, (backend.Function, backend.Constant)):
+                dc = backend.TestFunction(c.function_space()) if isinstance(c, backend.Function) else backend.Constant(1)
+                dform = backend.derivative(self.form, c, dc)
+            else:
+                continue
+            coefficients.update(ufl.algorithms.expand_derivatives(dform).coefficients())
+        return [block_output for block_output in self.get_dependencies() if block_output.get_output() in coefficients]
 
-                mesh = self.form.ufl_domain().ufl_cargo()
-                c_element = c.ufl_element()
+    @no_annotations
+    def evaluate_adj(self):
+        adj_input = self.get_outputs()[0].get_adj_output()
+        if adj_input is None:
+            return
+
+        # Dependencies that are not active do not depend on the controls.
+        dependencies = [block_output for block_output in self.get_dependencies() if block_output.active]
+        if not dependencies:
+            return
 
-                # In newer versions of FEniCS there is a method named reconstruct, thus we may
-                # in the future just call c_element.reconstruct(cell=mesh.ufl_cell()).
-                element = ufl.FiniteElement(c_element.family(), mesh.ufl_cell(), c_element.degree())
-                V = backend.FunctionSpace(mesh, element)
-                dc = backend.TestFunction(V)
+        form, replaced_coeffs = self._forms()
+
+        for block_output in dependencies:
+            c = block_output.get_output()
+            c_rep = replaced_coeffs.get(c, c)
 
-                dform = backend.derivative(form, c_rep, dc)
+            if isinstance(c, backend.Expression):
+                dform, V = self._form_cache.get(("dform", block_output),
+                                                lambda: self._expression_derivative(form, c, c_rep))
+                count("assemble")
                 output = backend.assemble(dform)
                 block_output.add_adj_output([[adj_input * output, V]])
 
                 continue
 
-            if isinstance(c, backend.Function):
-                dc = backend.TestFunction(c.function_space())
-            elif isinstance(c, backend.Constant):
-                dc = backend.Constant(1)
-
-            dform = backend.derivative(form, c_rep, dc)
+            dform = self._derivative(form, block_output, c_rep)
+            count("assemble")
             output = backend.assemble(dform)
             block_output.add_adj_output(adj_input * output)
 
     @no_annotations
     def evaluate_tlm(self):
-        replaced_coeffs = {}
-        for block_output in self.get_dependencies():
-            coeff = block_output.get_output()
-            replaced_coeffs[coeff] = block_output.get_saved_output()
-
-        form = backend.replace(self.form, replaced_coeffs)
+        form, replaced_coeffs = self._forms()
 
         for block_output in self.get_dependencies():
             c = block_output.get_output()
@@ -116,17 +158,20 @@ class AssembleBlock(Block):
                 continue
 
             if isinstance(c, backend.Function):
-                dform = backend.derivative(form, c_rep, tlm_value)
-                output = backend.assemble(dform)
+                dform = self._form_cache.get(("tlm_dform", block_output), lambda: backend.derivative(form, c_rep))
+                count("assemble")
+                output = backend.assemble(backend.action(dform, tlm_value))
                 self.get_outputs()[0].add_tlm_output(output)
 
             elif isinstance(c, backend.Constant):
-                dform = backend.derivative(form, c_rep, tlm_value)
-                output = backend.assemble(dform)
+                dform = self._derivative(form, block_output, c_rep)
+                count("assemble")
+                output = backend.assemble(tlm_value*dform)
                 self.get_outputs()[0].add_tlm_output(output)
 
             elif isinstance(c, backend.Expression):
                 dform = backend.derivative(form, c_rep, tlm_value)
+                count("assemble")
                 output = backend.assemble(dform)
                 self.get_outputs()[0].add_tlm_output(output)
 
@@ -135,25 +180,20 @@ class AssembleBlock(Block):
         hessian_input = self.get_outputs()[0].hessian_value
         adj_input = self.get_outputs()[0].adj_value
 
-        replaced_coeffs = {}
-        for block_output in self.get_dependencies():
-            coeff = block_output.get_output()
-            replaced_coeffs[coeff] = block_output.get_saved_output()
+        # The output does not depend on the controls, or the functional does not depend on it.
+        if adj_input is None:
+            return
 
-        form = backend.replace(self.form, replaced_coeffs)
+        form, replaced_coeffs = self._forms()
 
         for bo1 in self.get_dependencies():
             c1 = bo1.get_output()
             c1_rep = replaced_coeffs.get(c1, c1)
 
-            if isinstance(c1, backend.Function):
-                dc = backend.TestFunction(c1.function_space())
-            elif isinstance(c1, backend.Constant):
-                dc = backend.Constant(1)
-            else:
+            if not isinstance(c1, (backend.Function, backend.Constant)):
                 continue
 
-            dform = backend.derivative(form, c1_rep, dc)
+            dform = self._derivative(form, bo1, c1_rep)
 
             for bo2 in self.get_dependencies():
                 c2 = bo2.get_output()
@@ -165,15 +205,18 @@ class AssembleBlock(Block):
 
                 if isinstance(c1, backend.Function):
                     ddform = backend.derivative(dform, c2_rep, tlm_input)
+                    count("assemble")
                     output = backend.assemble(ddform)
                     bo1.add_hessian_output(adj_input*output)
                 elif isinstance(c1, backend.Constant):
                     ddform = backend.derivative(dform, c2_rep, tlm_input)
+                    count("assemble")
                     output = backend.assemble(ddform)
                     bo1.add_hessian_output(adj_input*output)
                 else:
                     continue
 
+            count("assemble")
             output = backend.assemble(dform)
             bo1.add_hessian_output(hessian_input*output)
 
@@ -186,6 +229,7 @@ class AssembleBlock(Block):
 
         form = backend.replace(self.form, replaced_coeffs)
 
+        count("assemble")
         output = backend.assemble(form)
         output = create_overloaded_object(output)
 
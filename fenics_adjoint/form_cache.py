@@ -0,0 +1,94 @@
+from pyadjoint.checkpoint_storage import StoredCheckpoint
+
+
+class FormCache(object):
+    """Keeps the forms a block derives from the saved outputs of its block outputs.
+
+    The symbolic manipulation of forms (replace, derivative, adjoint) gives the same result
+    as long as the same checkpoints are substituted in. A block calls :meth:`update` with
+    its block outputs at the start of a method, which removes the stored forms if any
+    of the saved outputs is not the same object as before, and gets its forms from :meth:`get`.
+
+    Forms refer to the checkpoints they are derived from. They are therefore only stored
+    if the checkpoints are kept in memory anyway, that is if the tape is not checkpointing
+    and the checkpoints are not held by a checkpoint storage. The cache registers itself with
+    the block outputs, so that it is cleared as soon as one of their checkpoints is replaced
+    (for example by a replay) or released, and does not keep the old checkpoints alive.
+
+    """
+    def __init__(self):
+        self._saved_outputs = []
+        self._forms = {}
+        self._keep = False
+
+    def update(self, block_outputs):
+        """Removes the stored forms if the saved outputs have changed.
+
+        Args:
+            block_outputs (list[BlockOutput]): The block outputs the forms are derived from.
+
+        """
+        tape = getattr(block_outputs[-1].output, "tape", None) if block_outputs else None
+        self._keep = ((tape is None or not tape.is_checkpointing())
+                      and not any(isinstance(bo._checkpoint, StoredCheckpoint) for bo in block_outputs))
+        if not self._keep:
+            self.clear()
+            return
+
+        saved_outputs = [bo.get_saved_output() for bo in block_outputs]
+        if (len(saved_outputs) != len(self._saved_outputs)
+                or any(a is not b for a, b in zip(saved_outputs, self._saved_outputs))):
+            # The saved outputs are kept, so that their ids are not reused while the forms are stored.
+            self._saved_outputs = saved_outputs
+            self._forms = {}
+            for bo in block_outputs:
+                bo.add_dependent_cache(self)
+
+    def get(self, key, compute=None):
+        """Returns the form stored under a key, and stores it first if it is missing.
+
+        Args:
+            key (hashable): Identifies the form within the block.
+            compute (function): Computes the form, called without arguments.
+                If None (default), None is returned for a missing form.
+
+        Returns:
+            object: The stored form (or any other object returned by `compute`).
+
+        """
+        if not self._keep:
+            return compute() if compute is not None else None
+        try:
+            return self._forms[key]
+        except KeyError:
+            if compute is None:
+                return None
+            form = compute()
+            self._forms[key] = form
+            return form
+
+    def set(self, key, value):
+        """Stores an object under a key, replacing the object stored before.
+
+        Args:
+            key (hashable): Identifies the object within the block.
+            value (object): The object, which must only depend on the saved outputs
+                and the values it is stored with.
+
+        """
+        if self._keep:
+            self._forms[key] = value
+
+    def remove(self, key):
+        """Removes the object stored under a key, if any.
+
+        Args:
+            key (hashable): Identifies the object within the block.
+
+        """
+        self._forms.pop(key, None)
+
+    def clear(self):
+        """Removes the stored forms and the references to the saved outputs."""
+        self._saved_outputs = []
+        self._forms = {}
@@ -0,0 +1,157 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import backend
+import numpy
+from pyadjoint.profiling import count
+
+from .types import compat
+
+
+class OperatorCache(object):
+    """A cache of assembled operators and their factorizations.
+
+    Many blocks of a tape often need the same operator, for example the adjoint of
+    a linear time-stepping scheme with coefficients that do not change in time.
+    The cache assembles the operator of such blocks once, and if the solve is direct,
+    factorizes it once.
+
+    Operators that are already assembled, such as the matrix of ``solve(A, x, b)``,
+    can also be factorized once, see :meth:`get_solver`.
+
+    Operators are identified by the signature of the form, the values of its coefficients
+    and mesh coordinates, the boundary conditions and the keyword arguments of assembly and
+    solve. Forms with coefficients whose values cannot be compared (such as Expressions)
+    are not cached. The least recently used operators are removed when the cache is full.
+
+    Args:
+        maxsize (int): The maximum number of operators to keep. 0 turns off the cache. Default 8.
+
+    """
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clear(self):
+        """Removes all operators from the cache."""
+        with self._lock:
+            self._entries = OrderedDict()
+
+    def get(self, form, bcs=[], assemble_kwargs={}, solver_kwargs={}):
+        """Returns the assembled operator of a bilinear form with homogeneous boundary conditions applied.
+
+        Args:
+            form (ufl.Form): The bilinear form.
+            bcs (list): The boundary conditions. DirichletBCs are homogenized before they are applied.
+            assemble_kwargs (dict): Keyword arguments to `backend.assemble`.
+            solver_kwargs (dict): Keyword arguments of the solves with the operator.
+
+        Returns:
+            tuple: The operator, and a solver with the operator factorized if `solver_kwargs`
+                ask for a direct solver, otherwise None. Neither may be changed.
+
+        """
+        key = self._key(form, bcs, assemble_kwargs, solver_kwargs) if self.maxsize > 0 else None
+        if key is not None:
+            with self._lock:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self._entries[key] = entry
+                    self.hits += 1
+                    return entry[:2]
+
+        count("assemble")
+        operator = backend.assemble(form, **assemble_kwargs)
+        for bc in bcs:
+            if isinstance(bc, backend.DirichletBC):
+                bc = compat.create_bc(bc, homogenize=True)
+            bc.apply(operator)
+        solver = compat.create_direct_solver(operator, solver_kwargs)
+
+        if key is not None:
+            with self._lock:
+                self.misses += 1
+                # The form and the boundary conditions keep the objects whose ids are part of the key alive,
+                # so that their ids cannot be reused by other objects while the entry exists.
+                self._entries[key] = (operator, solver, form, tuple(bcs))
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return operator, solver
+
+    def get_solver(self, operator, solver_kwargs={}):
+        """Returns a solver with an already assembled operator factorized.
+
+        The operator must not be changed while it is in the cache.
+
+        Args:
+            operator (Matrix): The operator.
+            solver_kwargs (dict): Keyword arguments of the solves with the operator.
+
+        Returns:
+            object: The solver, or None if `solver_kwargs` do not ask for a direct solver.
+
+        """
+        key = ("solver", id(operator), _freeze(solver_kwargs))
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+                self.hits += 1
+                return entry[1]
+
+        solver = compat.create_direct_solver(operator, solver_kwargs)
+        if self.maxsize > 0:
+            with self._lock:
+                self.misses += 1
+                # Keeps the operator, and with it its id, alive.
+                self._entries[key] = (operator, solver, None, ())
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return solver
+
+    def _key(self, form, bcs, assemble_kwargs, solver_kwargs):
+        key = [form.signature()]
+        key.extend(id(argument.ufl_function_space()) for argument in form.arguments())
+        for mesh in form.ufl_domains():
+            key.append((mesh.ufl_id(), _digest(compat.mesh_coordinates(mesh))))
+        for c in form.coefficients():
+            if isinstance(c, backend.Constant):
+                key.append(tuple(numpy.asarray(c.values()).ravel()))
+            elif isinstance(c, backend.Function):
+                key.append((id(c.function_space()), _digest(c.vector().get_local())))
+            else:
+                return None
+        key.extend(id(bc) for bc in bcs)
+        key.append(_freeze(assemble_kwargs))
+        key.append(_freeze(solver_kwargs))
+
+        key = tuple(key)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+
+def _digest(array):
+    return hashlib.sha1(numpy.ascontiguousarray(array).tobytes()).hexdigest()
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+_operator_cache = OperatorCache()
+
+
+def get_operator_cache():
+    """Returns the :class:`OperatorCache` used by the blocks."""
+    return _operator_cache
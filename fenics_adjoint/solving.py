@@ -1,25 +1,37 @@
+import threading
+
 import backend
 import ufl
 from pyadjoint.tape import get_working_tape, stop_annotating, annotate_tape, no_annotations
 from pyadjoint.block import Block
+from pyadjoint.profiling import count
 from .types import Function, DirichletBC
 from .types import compat
 from .types.function_space import extract_subfunction
+from .operator_cache import get_operator_cache
+from .form_cache import FormCache
 
 # Type dependencies
 
+# Serializes the adjoint solves of blocks evaluated in parallel (see pyadjoint.parallel),
+# since blocks with the same operator share its factorization, and the solvers are not thread-safe.
+_adjoint_solve_lock = threading.Lock()
+
 # TODO: Clean up: some inaccurate comments. Reused code. Confusing naming with dFdm when denoting the control as c.
 
 
 def solve(*args, **kwargs):
     annotate = annotate_tape(kwargs)
+    # Not passed on to the backend, see SolveBlock.
+    reuse_operator = kwargs.pop("reuse_operator", False)
 
     if annotate:
         tape = get_working_tape()
-        block = SolveBlock(*args, **kwargs)
+        block = SolveBlock(*args, reuse_operator=reuse_operator, **kwargs)
         tape.add_block(block)
 
     with stop_annotating():
+        count("solve")
         output = backend.solve(*args, **kwargs)
 
     if annotate:
@@ -36,8 +48,26 @@ def solve(*args, **kwargs):
 
 
 class SolveBlock(Block):
+    """Annotates a solve.
+
+    For a linear algebra solve ``solve(A, x, b)``, the keyword argument `reuse_operator=True`
+    keeps the matrix A on the block, and the adjoint equation is solved with A instead of
+    assembling the adjoint operator. If the form of A is symmetric, A is used as it is.
+    Otherwise a direct solver is asked for in the solver parameters, and its factorization
+    is used for a transpose solve. A must not be changed after the solve.
+
+    A solver method and preconditioner given as positional arguments, as in
+    ``solve(A, x, b, "cg", "ilu")``, are also used for the solves of the adjoint,
+    tangent linear and Hessian.
+
+    """
     def __init__(self, *args, **kwargs):
         super(SolveBlock, self).__init__()
+        reuse_operator = kwargs.pop("reuse_operator", False)
+        self.operator = None
+        self.symmetric = False
+        self.solver_args = ()
+        self._form_cache = FormCache()
         if isinstance(args[0], ufl.equation.Equation):
             # Variational problem.
             eq = args[0]
@@ -72,6 +102,8 @@ class SolveBlock(Block):
             if "solver_parameters" in kwargs and "mat_type" in kwargs["solver_parameters"]:
                 self.assemble_kwargs["mat_type"] = kwargs["solver_parameters"]["mat_type"]
 
+            self.solver_kwargs = self.kwargs
+
             #self.add_output(self.func.create_block_output())
         else:
             # Linear algebra problem.
@@ -84,6 +116,26 @@ class SolveBlock(Block):
             self.rhs = b.form
             self.bcs = A.bcs
             self.func = u.function
+            if not isinstance(self.bcs, list):
+                self.bcs = [self.bcs]
+
+            self.kwargs = kwargs
+            # The solver method and preconditioner, as in solve(A, x, b, "cg", "ilu").
+            self.solver_args = tuple(args[3:])
+            self.solver_kwargs = kwargs
+            if self.solver_args:
+                # Replays solve the variational problem, and the operator cache looks for a direct
+                # solver, both of which take the method and preconditioner as solver parameters.
+                parameters = {"linear_solver": self.solver_args[0]}
+                if len(self.solver_args) > 1:
+                    parameters["preconditioner"] = self.solver_args[1]
+                self.solver_kwargs = dict(kwargs, solver_parameters=parameters)
+            self.forward_kwargs = self.solver_kwargs.copy()
+            self.assemble_kwargs = {}
+
+            if reuse_operator:
+                self.operator = A
+                self.symmetric = A.form.signature() == backend.adjoint(A.form).signature()
 
         if isinstance(self.lhs, ufl.Form) and isinstance(self.rhs, ufl.Form):
             self.linear = True
@@ -104,103 +156,154 @@ class SolveBlock(Block):
 
     @no_annotations
     def evaluate_adj(self):
-        #t = backend.Timer("Solve:evaluate_adj")
-        #t4 = backend.Timer("Solve:adj:Prolog")
         fwd_block_output = self.get_outputs()[0]
-        u = fwd_block_output.get_output()
-        V = u.function_space()
-        adj_var = Function(V)
-
-        if self.linear:
-            tmp_u = Function(self.func.function_space()) # Replace later? Maybe save function space on initialization.
-            F_form = backend.action(self.lhs, tmp_u) - self.rhs
-        else:
-            tmp_u = self.func
-            F_form = self.lhs
-
-        replaced_coeffs = {}
-        for block_output in self.get_dependencies():
-            coeff = block_output.get_output()
-            if coeff in F_form.coefficients():
-                replaced_coeffs[coeff] = block_output.get_saved_output()
-
-        replaced_coeffs[tmp_u] = fwd_block_output.get_saved_output()
-
-        F_form = backend.replace(F_form, replaced_coeffs)
-
-        dFdu = backend.derivative(F_form, fwd_block_output.get_saved_output(), backend.TrialFunction(u.function_space()))
-        dFdu_form = backend.adjoint(dFdu)
-        dFdu = backend.assemble(dFdu_form, **self.assemble_kwargs)
 
         # Get dJdu from previous calculations.
         dJdu = fwd_block_output.get_adj_output()
 
-        # TODO: It might make sense to move this so we don't have to do the computations above.
         if dJdu is None:
             return
 
+        dependencies = self._adj_dependencies()
+        if not dependencies:
+            return
+
+        u = fwd_block_output.get_output()
+        V = u.function_space()
+        adj_var = Function(V)
+
+        F_form, replaced_coeffs = self._forms()
+        dFdu_form = self._form_cache.get("adj_dFdu", lambda: backend.adjoint(self._dFdu(F_form)))
+
         dJdu_copy = dJdu.copy()
 
-        # Homogenize and apply boundary conditions on adj_dFdu and dJdu.
+        # Homogenize and apply boundary conditions on dJdu, the adjoint operator has them applied.
         bcs = []
         for bc in self.bcs:
             if isinstance(bc, backend.DirichletBC):
                 bc = compat.create_bc(bc, homogenize=True)
             bcs.append(bc)
-            bc.apply(dFdu, dJdu)
+            bc.apply(dJdu)
+
+        self._solve_adjoint(dFdu_form, adj_var, dJdu, bcs)
+        # The second order adjoint equation needs the same solution, for as long as dJdu is the adjoint input.
+        # It is only kept if a Hessian evaluation follows, see Tape.prepares_hessian.
+        tape = getattr(u, "tape", None)
+        if tape is not None and tape.prepares_hessian():
+            self._form_cache.set("adj_sol", (dJdu, adj_var))
+        else:
+            self._form_cache.remove("adj_sol")
 
-        backend.solve(dFdu, adj_var.vector(), dJdu, **self.kwargs)
+        adj_var_bdy = None
+        for block_output in dependencies:
+            c = block_output.get_output()
+            c_rep = replaced_coeffs.get(c, c)
 
-        adj_var_bdy = Function(V)
-        adj_var_bdy = compat.evaluate_algebra_expression(dJdu_copy -
-                                                         backend.assemble(backend.action(dFdu_form, adj_var)),
-                                                         adj_var_bdy)
-        for block_output in self.get_dependencies():
+            if isinstance(c, backend.Function):
+                dFdm = self._form_cache.get(("adj_dFdm", block_output), lambda: backend.adjoint(
+                    -backend.derivative(F_form, c_rep, backend.TrialFunction(c.function_space()))))
+                dFdm = dFdm*adj_var
+                count("assemble")
+                dFdm = backend.assemble(dFdm, **self.assemble_kwargs)
+
+                block_output.add_adj_output(dFdm)
+            elif isinstance(c, backend.Constant):
+                dFdm = self._form_cache.get(("dFdm", block_output),
+                                            lambda: -backend.derivative(F_form, c_rep, backend.Constant(1)))
+                count("assemble")
+                dFdm = backend.assemble(dFdm, **self.assemble_kwargs)
+
+                [bc.apply(dFdm) for bc in bcs]
+
+                block_output.add_adj_output(compat.inner(dFdm, adj_var.vector()))
+            elif isinstance(c, backend.DirichletBC):
+                if adj_var_bdy is None:
+                    adj_var_bdy = Function(V)
+                    count("assemble")
+                    adj_var_bdy = compat.evaluate_algebra_expression(
+                        dJdu_copy - backend.assemble(backend.action(dFdu_form, adj_var)), adj_var_bdy)
+                tmp_bc = compat.create_bc(c, value=extract_subfunction(adj_var_bdy, c.function_space()))
+                block_output.add_adj_output([tmp_bc])
+            elif isinstance(c, backend.Expression):
+                # TODO: What space to use?
+                dFdm = self._form_cache.get(("dFdm", block_output),
+                                            lambda: -backend.derivative(F_form, c_rep, backend.TrialFunction(V)))
+                count("assemble")
+                dFdm = backend.assemble(dFdm, **self.assemble_kwargs)
+
+                dFdm_mat = backend.as_backend_type(dFdm).mat()
+
+                import numpy as np
+                bc_rows = []
+                for bc in bcs:
+                    for key in bc.get_boundary_values():
+                        bc_rows.append(key)
+
+                dFdm.zero(np.array(bc_rows, dtype=np.intc))
+
+                dFdm_mat.transpose(dFdm_mat)
+
+                block_output.add_adj_output([[dFdm*adj_var.vector(), V]])
+
+    def _adj_dependencies(self):
+        # Dependencies that are not active do not depend on the controls.
+        return [block_output for block_output in self.get_dependencies()
+                if block_output.active and (block_output.get_output() != self.func or self.linear)]
+
+    def get_stored_data(self):
+        # The adjoint input is counted with the block outputs.
+        stored = self._form_cache.get("adj_sol")
+        return [stored[1]] if stored is not None else []
+
+    def get_adj_reads(self):
+        dependencies = self._adj_dependencies()
+        if not dependencies:
+            return []
+
+        # The unreplaced forms of _replace_forms.
+        V = self.func.function_space()
+        if self.linear:
+            tmp_u = Function(V)
+            F_form = backend.action(self.lhs, tmp_u) - self.rhs
+        else:
+            tmp_u = self.func
+            F_form = self.lhs
+
+        # The adjoint operator, and the derivatives with respect to the dependencies.
+        # DirichletBC dependencies only need the adjoint operator.
+        forms = [backend.derivative(F_form, tmp_u, backend.TrialFunction(V))]
+        for block_output in dependencies:
             c = block_output.get_output()
-            if c != self.func or self.linear:
-                c_rep = replaced_coeffs.get(c, c)
-
-                if isinstance(c, backend.Function):
-                    dFdm = -backend.derivative(F_form, c_rep, backend.TrialFunction(c.function_space()))
-                    dFdm = backend.adjoint(dFdm)
-                    dFdm = dFdm*adj_var
-                    dFdm = backend.assemble(dFdm, **self.assemble_kwargs)
-
-                    block_output.add_adj_output(dFdm)
-                elif isinstance(c, backend.Constant):
-                    dFdm = -backend.derivative(F_form, c_rep, backend.Constant(1))
-                    dFdm = backend.assemble(dFdm, **self.assemble_kwargs)
-
-                    [bc.apply(dFdm) for bc in bcs]
-
-                    block_output.add_adj_output(compat.inner(dFdm, adj_var.vector()))
-                elif isinstance(c, backend.DirichletBC):
-                    tmp_bc = compat.create_bc(c, value=extract_subfunction(adj_var_bdy, c.function_space()))
-                    block_output.add_adj_output([tmp_bc])
-                elif isinstance(c, backend.Expression):
-                    dFdm = -backend.derivative(F_form, c_rep, backend.TrialFunction(V)) # TODO: What space to use?
-                    dFdm = backend.assemble(dFdm, **self.assemble_kwargs)
-
-                    dFdm_mat = backend.as_backend_type(dFdm).mat()
-
-                    import numpy as np
-                    bc_rows = []
-                    for bc in bcs:
-                        for key in bc.get_boundary_values():
-                            bc_rows.append(key)
+            if isinstance(c, backend.Function):
+                forms.append(backend.derivative(F_form, c, backend.TrialFunction(c.function_space())))
+            elif isinstance(c, backend.Constant):
+                forms.append(backend.derivative(F_form, c, backend.Constant(1)))
+            elif isinstance(c, backend.Expression):
+                forms.append(backend.derivative(F_form, c, backend.TrialFunction(V)))
 
-                    dFdm.zero(np.array(bc_rows, dtype=np.intc))
+        coefficients = set()
+        for form in forms:
+            coefficients.update(ufl.algorithms.expand_derivatives(form).coefficients())
 
-                    dFdm_mat.transpose(dFdm_mat)
+        # In nonlinear problems the saved output replaces the dependency on the initial guess.
+        reads = [block_output for block_output in self.get_dependencies()
+                 if block_output.get_output() in coefficients and (self.linear or block_output.get_output() != self.func)]
+        if tmp_u in coefficients:
+            reads.extend(self.get_outputs())
+        return reads
 
-                    block_output.add_adj_output([[dFdm*adj_var.vector(), V]])
+    def _forms(self):
+        """Returns the equation form with the saved outputs substituted in, and the substitutions.
 
-    @no_annotations
-    def evaluate_tlm(self):
-        fwd_block_output = self.get_outputs()[0]
-        u = fwd_block_output.get_output()
-        V = u.function_space()
+        The forms derived from it are kept in the form cache of the block,
+        until the saved outputs change.
 
+        """
+        self._form_cache.update(self.get_dependencies() + self.get_outputs())
+        return self._form_cache.get("F", self._replace_forms)
+
+    def _replace_forms(self):
+        fwd_block_output = self.get_outputs()[0]
         if self.linear:
             tmp_u = Function(self.func.function_space()) # Replace later? Maybe save function space on initialization.
             F_form = backend.action(self.lhs, tmp_u) - self.rhs
@@ -216,20 +319,67 @@ class SolveBlock(Block):
 
         replaced_coeffs[tmp_u] = fwd_block_output.get_saved_output()
 
-        F_form = backend.replace(F_form, replaced_coeffs)
+        return backend.replace(F_form, replaced_coeffs), replaced_coeffs
+
+    def _dFdu(self, F_form):
+        u = self.get_outputs()[0].get_saved_output()
+        return self._form_cache.get("dFdu", lambda: backend.derivative(F_form, u, backend.TrialFunction(u.function_space())))
+
+    def _solve_adjoint(self, dFdu_form, adj_var, dJdu, bcs):
+        with _adjoint_solve_lock:
+            cache = get_operator_cache()
+            if self.operator is not None:
+                solver = cache.get_solver(self.operator, self.solver_kwargs)
+                if self.symmetric:
+                    if solver is not None:
+                        count("solve")
+                        solver.solve(adj_var.vector(), dJdu)
+                    else:
+                        self._linear_solve(self.operator, adj_var.vector(), dJdu)
+                    return
+                if solver is not None:
+                    count("solve")
+                    compat.solve_transpose(solver, adj_var.vector(), dJdu)
+                    # Boundary rows of the operator become columns in the transpose,
+                    # so the boundary values of the solution are not zero.
+                    for bc in bcs:
+                        compat.zero_bc_dofs(bc, adj_var.vector())
+                    return
+
+            # Blocks with the same adjoint operator share its assembly and factorization.
+            dFdu, solver = cache.get(dFdu_form, self.bcs, self.assemble_kwargs, self.solver_kwargs)
+            if solver is not None:
+                count("solve")
+                solver.solve(adj_var.vector(), dJdu)
+            else:
+                self._linear_solve(dFdu, adj_var.vector(), dJdu)
+
+    def _linear_solve(self, A, x, b):
+        count("solve")
+        if self.solver_args:
+            # The linear algebra solve of dolfin takes no keyword arguments.
+            backend.solve(A, x, b, *self.solver_args)
+        else:
+            backend.solve(A, x, b, **self.kwargs)
+
+    @no_annotations
+    def evaluate_tlm(self):
+        fwd_block_output = self.get_outputs()[0]
+        u = fwd_block_output.get_output()
+        V = u.function_space()
 
-        # Obtain dFdu.
-        dFdu = backend.derivative(F_form, fwd_block_output.get_saved_output(), backend.TrialFunction(u.function_space()))
+        F_form, replaced_coeffs = self._forms()
 
-        dFdu = backend.assemble(dFdu, **self.assemble_kwargs)
+        # Obtain dFdu, with homogenized boundary conditions applied.
+        # It is shared with other blocks, and with the Hessian sweep if the form is symmetric.
+        dFdu, solver = get_operator_cache().get(self._dFdu(F_form), self.bcs, self.assemble_kwargs,
+                                                self.solver_kwargs)
 
-        # Homogenize and apply boundary conditions on dFdu.
         bcs = []
         for bc in self.bcs:
             if isinstance(bc, backend.DirichletBC):
                 bc = compat.create_bc(bc, homogenize=True)
             bcs.append(bc)
-            bc.apply(dFdu)
 
         for block_output in self.get_dependencies():
             tlm_value = block_output.tlm_value
@@ -243,17 +393,20 @@ class SolveBlock(Block):
                 continue
 
             if isinstance(c, backend.Function):
-                #dFdm = -backend.derivative(F_form, c_rep, backend.Function(V, tlm_value))
-                dFdm = -backend.derivative(F_form, c_rep, tlm_value)
-                dFdm = backend.assemble(dFdm, **self.assemble_kwargs)
+                dFdm = self._form_cache.get(("tlm_dFdm", block_output), lambda: -backend.derivative(
+                    F_form, c_rep, backend.TrialFunction(c.function_space())))
+                count("assemble")
+                dFdm = backend.assemble(backend.action(dFdm, tlm_value), **self.assemble_kwargs)
 
                 # Zero out boundary values from boundary conditions as they do not depend (directly) on c.
                 for bc in bcs:
                     bc.apply(dFdm)
 
             elif isinstance(c, backend.Constant):
-                dFdm = -backend.derivative(F_form, c_rep, tlm_value)
-                dFdm = backend.assemble(dFdm, **self.assemble_kwargs)
+                dFdm = self._form_cache.get(("dFdm", block_output),
+                                            lambda: -backend.derivative(F_form, c_rep, backend.Constant(1)))
+                count("assemble")
+                dFdm = backend.assemble(tlm_value*dFdm, **self.assemble_kwargs)
 
                 # Zero out boundary values from boundary conditions as they do not depend (directly) on c.
                 for bc in bcs:
@@ -262,10 +415,12 @@ class SolveBlock(Block):
             elif isinstance(c, backend.DirichletBC):
                 #tmp_bc = backend.DirichletBC(V, tlm_value, c_rep.user_sub_domain())
                 dFdm = backend.Function(V).vector()
-                tlm_value.apply(dFdu, dFdm)
+                # The rows of dFdu are already those of the identity at the boundary.
+                tlm_value.apply(dFdm)
 
             elif isinstance(c, backend.Expression):
                 dFdm = -backend.derivative(F_form, c_rep, tlm_value)
+                count("assemble")
                 dFdm = backend.assemble(dFdm, **self.assemble_kwargs)
 
                 # Zero out boundary values from boundary conditions as they do not depend (directly) on c.
@@ -273,7 +428,11 @@ class SolveBlock(Block):
                     bc.apply(dFdm)
 
             dudm = Function(V)
-            backend.solve(dFdu, dudm.vector(), dFdm, **self.kwargs)
+            if solver is not None:
+                count("solve")
+                solver.solve(dudm.vector(), dFdm)
+            else:
+                self._linear_solve(dFdu, dudm.vector(), dFdm)
 
             fwd_block_output.add_tlm_output(dudm)
 
@@ -287,23 +446,13 @@ class SolveBlock(Block):
         u = fwd_block_output.get_output()
         V = u.function_space()
 
+        # The output does not depend on the controls, or the functional does not depend on it.
+        if adj_input is None:
+            return
+
         # Process the equation forms, replacing values with checkpoints,
         # and gathering lhs and rhs in one single form.
-        if self.linear:
-            tmp_u = Function(self.func.function_space()) # Replace later? Maybe save function space on initialization.
-            F_form = backend.action(self.lhs, tmp_u) - self.rhs
-        else:
-            tmp_u = self.func
-            F_form = self.lhs
-
-        replaced_coeffs = {}
-        for block_output in self.get_dependencies():
-            coeff = block_output.get_output()
-            if coeff in F_form.coefficients():
-                replaced_coeffs[coeff] = block_output.get_saved_output()
-
-        replaced_coeffs[tmp_u] = fwd_block_output.get_saved_output()
-        F_form = backend.replace(F_form, replaced_coeffs)
+        F_form, replaced_coeffs = self._forms()
 
         # Define the equation Form. This class is an initial step in refactoring
         # the SolveBlock methods.
@@ -313,19 +462,24 @@ class SolveBlock(Block):
         bcs = F.bcs
 
         # Using the equation Form we derive dF/du, d^2F/du^2 * du/dm * direction.
-        dFdu_form = backend.derivative(F_form, fwd_block_output.get_saved_output())
+        dFdu_form = self._dFdu(F_form)
         d2Fdu2 = ufl.algorithms.expand_derivatives(backend.derivative(dFdu_form, fwd_block_output.get_saved_output(), tlm_output))
 
-        dFdu = backend.adjoint(dFdu_form)
-        dFdu = backend.assemble(dFdu, **self.assemble_kwargs)
+        adj_dFdu_form = self._form_cache.get("adj_dFdu", lambda: backend.adjoint(dFdu_form))
 
-        for bc in bcs:
-            bc.apply(dFdu, adj_input)
+        # The first order adjoint solution is kept from evaluate_adj, unless the adjoint input
+        # or the saved outputs have changed since. It is released once it has been used here.
+        stored = self._form_cache.get("adj_sol")
+        self._form_cache.remove("adj_sol")
+        if stored is not None and stored[0] is adj_input:
+            adj_sol = stored[1]
+        else:
+            for bc in bcs:
+                bc.apply(adj_input)
 
-        # TODO: First-order adjoint solution should be possible to obtain from the earlier adjoint computations.
-        adj_sol = backend.Function(V)
-        # Solve the (first order) adjoint equation
-        backend.solve(dFdu, adj_sol.vector(), adj_input, **self.kwargs)
+            adj_sol = backend.Function(V)
+            # Solve the (first order) adjoint equation
+            self._solve_adjoint(adj_dFdu_form, adj_sol, adj_input, bcs)
 
         # Second-order adjoint (soa) solution
         adj_sol2 = backend.Function(V)
@@ -348,16 +502,18 @@ class SolveBlock(Block):
 
         if len(b_form.integrals()) > 0:
             b_form = backend.adjoint(b_form)
+            count("assemble")
             b -= backend.assemble(backend.action(b_form, adj_sol))
         b_copy = b.copy()
 
         for bc in bcs:
-            bc.apply(dFdu, b)
+            bc.apply(b)
 
-        # Solve the soa equation
-        backend.solve(dFdu, adj_sol2.vector(), b, **self.kwargs)
+        # Solve the soa equation, with the adjoint operator of evaluate_adj.
+        self._solve_adjoint(adj_dFdu_form, adj_sol2, b, bcs)
 
         adj_sol2_bdy = Function(V)
+        count("assemble")
         adj_sol2_bdy = compat.evaluate_algebra_expression(b_copy -
                                                           backend.assemble(backend.action(dFdu_form, adj_sol2)),
                                                           adj_sol2_bdy)
@@ -386,7 +542,7 @@ class SolveBlock(Block):
                 # TODO: should this be a TrialFunction?
             else:
                 dc = backend.TrialFunction(V)
-            dFdm = backend.derivative(F_form, c_rep, dc)
+            dFdm = self._form_cache.get(("hessian_dFdm", bo), lambda: backend.derivative(F_form, c_rep, dc))
             # TODO: Actually implement split annotations properly.
             try:
                 d2Fdudm = ufl.algorithms.expand_derivatives(backend.derivative(dFdm, fwd_block_output.get_saved_output(), tlm_output))
@@ -418,6 +574,7 @@ class SolveBlock(Block):
                     d2Fdm2 = backend.adjoint(d2Fdm2)
 
                 output = backend.action(d2Fdm2, adj_sol)
+                count("assemble")
                 output = backend.assemble(-output)
 
                 if isinstance(c, backend.Expression):
@@ -426,13 +583,14 @@ class SolveBlock(Block):
                     bo.add_hessian_output(output)
 
             if len(dFdm.arguments()) >= 2:
-                dFdm = backend.adjoint(dFdm)
+                dFdm = self._form_cache.get(("hessian_adj_dFdm", bo), lambda: backend.adjoint(dFdm))
             output = backend.action(dFdm, adj_sol2)
             if not d2Fdudm.empty():
                 if len(d2Fdudm.arguments()) >= 2:
                     d2Fdudm = backend.adjoint(d2Fdudm)
                 output += backend.action(d2Fdudm, adj_sol)
 
+            count("assemble")
             output = backend.assemble(-output)
 
             if isinstance(c, backend.Expression):
@@ -465,6 +623,7 @@ class SolveBlock(Block):
         if self.linear:
             rhs = backend.replace(self.rhs, replace_rhs_coeffs)
 
+        count("solve")
         backend.solve(lhs == rhs, func, self.bcs, **self.forward_kwargs)
         # Save output for use in later re-computations.
         # TODO: Consider redesigning the saving system so a new deepcopy isn't created on each forward replay.
@@ -544,6 +703,7 @@ class Form(object):
         if self.form.empty():
             return None
 
+        count("assemble")
         data = backend.assemble(self.form)
 
         # Apply boundary conditions here!
@@ -62,6 +62,45 @@ if backend.__name__ == "firedrake":
         """
         return a.vector().inner(b)
 
+    def create_direct_solver(A, kwargs):
+        """Create a solver that factorizes A once and reuses the factorization.
+
+        :arg A: The (assembled) matrix.
+        :arg kwargs: The keyword arguments of the solve.
+
+        Returns None if the solver parameters in kwargs do not ask for
+        a direct solver.
+        """
+        parameters = kwargs.get("solver_parameters", {})
+        if parameters.get("ksp_type") != "preonly" or parameters.get("pc_type") not in ("lu", "cholesky"):
+            return None
+        return backend.LinearSolver(A, solver_parameters=parameters)
+
+    def mesh_coordinates(mesh):
+        """Return the coordinates of a mesh as a NumPy array.
+
+        :arg mesh: The mesh, as returned by ``form.ufl_domains()``.
+        """
+        return mesh.coordinates.dat.data_ro
+
+    def solve_transpose(solver, x, b):
+        """Solve with the transpose of the operator of a solver.
+
+        :arg solver: A solver from :func:`create_direct_solver`.
+        :arg x: The solution Vector.
+        :arg b: The right hand side Vector.
+        """
+        with b.dat.vec_ro as b_vec, x.dat.vec as x_vec:
+            solver.ksp.solveTranspose(b_vec, x_vec)
+
+    def zero_bc_dofs(bc, x):
+        """Set the values of a Vector at the dofs of a bc to zero.
+
+        :arg bc: A homogeneous :class:`~.DirichletBC`.
+        :arg x: The Vector.
+        """
+        x.dat.data[bc.nodes] = 0
+
     def extract_bc_subvector(value, Vtarget, bc):
         """Extract from value (a function in a mixed space), the sub
         function corresponding to the part of the space bc applies
@@ -133,6 +172,54 @@ else:
         """
         return a.inner(b)
 
+    _direct_methods = ("default", "direct", "lu", "mumps", "umfpack", "superlu", "superlu_dist", "petsc")
+
+    def create_direct_solver(A, kwargs):
+        """Create a solver that factorizes A once and reuses the factorization.
+
+        :arg A: The (assembled) matrix.
+        :arg kwargs: The keyword arguments of the solve.
+
+        Returns None if the solver parameters in kwargs do not ask for
+        a direct solver.
+        """
+        method = kwargs.get("solver_parameters", {}).get("linear_solver", "default")
+        if method not in _direct_methods:
+            return None
+        if method in ("direct", "lu"):
+            method = "default"
+        solver = backend.LUSolver(backend.as_backend_type(A), method)
+        try:
+            solver.parameters["reuse_factorization"] = True
+        except (KeyError, RuntimeError):
+            # Newer versions always reuse the factorization.
+            pass
+        return solver
+
+    def mesh_coordinates(mesh):
+        """Return the coordinates of a mesh as a NumPy array.
+
+        :arg mesh: The mesh, as returned by ``form.ufl_domains()``.
+        """
+        return mesh.ufl_cargo().coordinates()
+
+    def solve_transpose(solver, x, b):
+        """Solve with the transpose of the operator of a solver.
+
+        :arg solver: A solver from :func:`create_direct_solver`.
+        :arg x: The solution Vector.
+        :arg b: The right hand side Vector.
+        """
+        solver.solve_transpose(x, b)
+
+    def zero_bc_dofs(bc, x):
+        """Set the values of a Vector at the dofs of a bc to zero.
+
+        :arg bc: A homogeneous :class:`~.DirichletBC`.
+        :arg x: The Vector.
+        """
+        bc.apply(x)
+
     def extract_bc_subvector(value, Vtarget, bc):
         """Extract from value (a function in a mixed space), the sub
         function corresponding to the part of the space bc applies
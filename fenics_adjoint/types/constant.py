@@ -21,6 +21,14 @@ class Constant(OverloadedType, backend.Constant):
     def _ad_restore_at_checkpoint(self, checkpoint):
         return checkpoint
 
+    def _ad_pack_checkpoint(self, checkpoint):
+        return checkpoint.values()
+
+    def _ad_unpack_checkpoint(self, array):
+        if self.ufl_shape == ():
+            return Constant(array[0])
+        return Constant(array)
+
     def _ad_mul(self, other):
         return Constant(self*other)
 
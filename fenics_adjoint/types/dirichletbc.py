@@ -138,5 +138,5 @@ class DirichletBCBlock(Block):
     def recompute(self):
         # TODO: Here we assume only 1 dependency. Is this always valid?
         if len(self.get_dependencies()) > 0:
-            self.bc.set_value(self.get_dependencies()[0].checkpoint)
+            self.bc.set_value(self.get_dependencies()[0].get_saved_output())
 
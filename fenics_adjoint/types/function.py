@@ -66,6 +66,16 @@ class Function(OverloadedType, backend.Function):
     def _ad_restore_at_checkpoint(self, checkpoint):
         return checkpoint
 
+    def _ad_pack_checkpoint(self, checkpoint):
+        return checkpoint.vector().get_local()
+
+    @no_annotations
+    def _ad_unpack_checkpoint(self, array):
+        checkpoint = Function(self.function_space())
+        checkpoint.vector().set_local(array)
+        checkpoint.vector().apply("insert")
+        return checkpoint
+
     @no_annotations
     def adj_update_value(self, value):
         self.original_block_output.checkpoint = value._ad_create_checkpoint()
@@ -92,6 +102,9 @@ class AssignBlock(Block):
         self.add_dependency(func.get_block_output())
         self.add_dependency(other.get_block_output())
 
+    def get_adj_reads(self):
+        return []
+
     @no_annotations
     def evaluate_adj(self):
         adj_input = self.get_outputs()[0].get_adj_output()
@@ -116,4 +129,8 @@ class AssignBlock(Block):
         deps = self.get_dependencies()
         other_bo = deps[1]
 
-        backend.Function.assign(self.get_outputs()[0].get_saved_output(), other_bo.get_saved_output())
+        # Assign to a new checkpoint, the old one might have been dropped.
+        output = self.get_outputs()[0]
+        func = Function(output.output.function_space())
+        backend.Function.assign(func, other_bo.get_saved_output())
+        output.checkpoint = func
@@ -10,8 +10,10 @@ from .variational_solver import (NonlinearVariationalProblem, NonlinearVariation
 from pyadjoint.tape import Tape, set_working_tape, get_working_tape, pause_annotation
 from pyadjoint.reduced_functional import ReducedFunctional
 from pyadjoint.verification import taylor_test, taylor_test_multiple
-from pyadjoint.drivers import compute_gradient, Hessian
+from pyadjoint.drivers import compute_gradient, compute_jacobian, compute_jacobian_action, Hessian
 from pyadjoint.adjfloat import AdjFloat
+from pyadjoint.adjarray import AdjArray
+from pyadjoint.scalar_tape import ScalarTape
 
 tape = Tape()
 set_working_tape(tape)
@@ -0,0 +1,421 @@
+import numpy
+
+from .tape import get_working_tape, annotate_tape, stop_annotating
+from .block import Block
+from .overloaded_type import OverloadedType
+from .adjfloat import AdjFloat
+
+
+def _plain(value):
+    """Returns the value as a float or a plain ndarray, for computing with it."""
+    if isinstance(value, float):
+        # AdjFloat is a numpy scalar, which NumPy does not always handle well.
+        return float(value)
+    if isinstance(value, numpy.ndarray):
+        return value.view(numpy.ndarray)
+    return numpy.asarray(value, dtype=float)
+
+
+def _create(value):
+    """Returns an overloaded object holding the result of an operation."""
+    if numpy.ndim(value) == 0:
+        return AdjFloat(float(value))
+    return numpy.asarray(value, dtype=float).view(AdjArray)
+
+
+def _unbroadcast(value, shape):
+    """Sums `value` over the axes that were broadcast to go from `shape` to its shape."""
+    value = numpy.asarray(value)
+    if value.shape == tuple(shape):
+        return value
+    while value.ndim > len(shape):
+        value = value.sum(axis=0)
+    for axis, size in enumerate(shape):
+        if size == 1 and value.shape[axis] != 1:
+            value = value.sum(axis=axis, keepdims=True)
+    return value
+
+
+def _annotated(block_class, operands, *args):
+    """Computes an operation on the operands and puts a block on the tape if annotating."""
+    output = _create(block_class.operator(*([_plain(op) for op in operands] + list(args))))
+    if annotate_tape():
+        block = block_class(operands, *args)
+        tape = get_working_tape()
+        tape.add_block(block)
+        block.add_output(output.get_block_output())
+    return output
+
+
+class AdjArray(OverloadedType, numpy.ndarray):
+    """An overloaded NumPy array of floats.
+
+    Elementwise arithmetic with other arrays, AdjFloat instances and numbers, the reductions
+    :meth:`sum`, :meth:`dot` and :meth:`norm`, and indexing are annotated as one block each.
+    Results with zero dimensions are returned as :class:`AdjFloat`.
+
+    The NumPy functions `numpy.add`, `numpy.subtract`, `numpy.multiply`, `numpy.divide`,
+    `numpy.power` and `numpy.negative` are annotated like the operators. Other NumPy ufuncs
+    return plain arrays, except that while annotating they raise a TypeError if they compute
+    floats from an array, since their derivative would be lost.
+
+    In-place operators return a new array instead of changing the array. Item assignment
+    and the `out` argument of ufuncs raise a TypeError, as changes to the data of an array
+    cannot be annotated.
+
+    Args:
+        input_array (array_like): The values. They are copied.
+
+    """
+    def __new__(cls, input_array, **kwargs):
+        return numpy.array(_plain(input_array), dtype=float).view(cls)
+
+    def __init__(self, input_array, **kwargs):
+        # OverloadedType is initialized in __array_finalize__,
+        # which is also called for arrays created by NumPy.
+        tape = kwargs.pop("tape", None)
+        if tape is not None:
+            self.tape = tape
+
+    def __array_finalize__(self, obj):
+        OverloadedType.__init__(self)
+
+    def __repr__(self):
+        return "AdjArray({})".format(numpy.array2string(self.view(numpy.ndarray), separator=", "))
+
+    def __str__(self):
+        return str(self.view(numpy.ndarray))
+
+    def __add__(self, other):
+        return _annotated(AddBlock, (self, other))
+
+    def __radd__(self, other):
+        return _annotated(AddBlock, (other, self))
+
+    def __sub__(self, other):
+        return _annotated(SubBlock, (self, other))
+
+    def __rsub__(self, other):
+        return _annotated(SubBlock, (other, self))
+
+    def __mul__(self, other):
+        return _annotated(MulBlock, (self, other))
+
+    def __rmul__(self, other):
+        return _annotated(MulBlock, (other, self))
+
+    def __truediv__(self, other):
+        return _annotated(DivBlock, (self, other))
+
+    def __rtruediv__(self, other):
+        return _annotated(DivBlock, (other, self))
+
+    __div__ = __truediv__
+    __rdiv__ = __rtruediv__
+
+    def __pow__(self, power):
+        return _annotated(PowBlock, (self, power))
+
+    def __rpow__(self, other):
+        return _annotated(PowBlock, (other, self))
+
+    def __neg__(self):
+        return _annotated(NegBlock, (self,))
+
+    __iadd__ = __add__
+    __isub__ = __sub__
+    __imul__ = __mul__
+    __itruediv__ = __truediv__
+    __idiv__ = __div__
+    __ipow__ = __pow__
+
+    def __getitem__(self, index):
+        return _annotated(GetItemBlock, (self,), index)
+
+    def __setitem__(self, index, value):
+        raise TypeError("AdjArray does not support item assignment, as it changes the array in place. "
+                        "Create a new AdjArray instead.")
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        block_class = _ufunc_blocks.get(ufunc)
+        if method == "__call__" and block_class is not None and not kwargs:
+            return _annotated(block_class, inputs)
+
+        if any(isinstance(out, AdjArray) for out in kwargs.get("out", ())):
+            raise TypeError("numpy.{} cannot write to an AdjArray, as it changes the array in place."
+                            .format(ufunc.__name__))
+        inputs = [x.view(numpy.ndarray) if isinstance(x, AdjArray) else x for x in inputs]
+        result = getattr(ufunc, method)(*inputs, **kwargs)
+        if annotate_tape() and any(numpy.issubdtype(numpy.result_type(r), numpy.inexact)
+                                   for r in (result if isinstance(result, tuple) else (result,))):
+            raise TypeError("numpy.{} is not annotated for AdjArray, so its derivative would be lost. "
+                            "Use the values of the array instead, as in `x.view(numpy.ndarray)`."
+                            .format(ufunc.__name__))
+        return result
+
+    def sum(self, axis=None, **kwargs):
+        """Returns the sum of the elements over the given axis.
+
+        Args:
+            axis (int|None): The axis to sum over. If None (default), all elements are summed.
+
+        Other keyword arguments are passed to `numpy.ndarray.sum`, in which case the sum
+        is not annotated.
+
+        """
+        kwargs = dict((k, v) for k, v in kwargs.items() if v is not None and v is not False)
+        if kwargs:
+            return numpy.ndarray.sum(self.view(numpy.ndarray), axis=axis, **kwargs)
+        return _annotated(SumBlock, (self,), axis)
+
+    def dot(self, other):
+        """Returns the dot product with another 1-D or 2-D array, as `numpy.dot`."""
+        return _annotated(DotBlock, (self, other))
+
+    def __matmul__(self, other):
+        return self.dot(other)
+
+    def __rmatmul__(self, other):
+        return _annotated(DotBlock, (other, self))
+
+    def norm(self):
+        """Returns the Euclidean norm of the (flattened) array."""
+        return _annotated(NormBlock, (self,))
+
+    def get_derivative(self, options={}):
+        return self._ad_convert_type(self.get_adj_output(), options)
+
+    def _ad_convert_type(self, value, options={}):
+        with stop_annotating():
+            return AdjArray(value)
+
+    def adj_update_value(self, value):
+        self.original_block_output.checkpoint = numpy.array(_plain(value), dtype=float)
+
+    def _ad_create_checkpoint(self):
+        return numpy.array(self.view(numpy.ndarray))
+
+    def _ad_restore_at_checkpoint(self, checkpoint):
+        return checkpoint
+
+    def _ad_pack_checkpoint(self, checkpoint):
+        return checkpoint.ravel()
+
+    def _ad_unpack_checkpoint(self, array):
+        return numpy.array(array).reshape(self.shape)
+
+    def _ad_mul(self, other):
+        with stop_annotating():
+            return self*other
+
+    def _ad_add(self, other):
+        with stop_annotating():
+            return self + other
+
+    def _ad_dot(self, other):
+        return float(numpy.vdot(_plain(self), _plain(other)))
+
+
+class ArrayOperatorBlock(Block):
+    """Base class for the blocks of :class:`AdjArray` operations.
+
+    Operands that are not overloaded are stored as constants.
+
+    Subclasses define `operator`, which computes the output from the operand values
+    (followed by the extra arguments of the block), and implement :meth:`adjoint`
+    and :meth:`tangent` for a single operand.
+
+    """
+    operator = None
+
+    def __init__(self, operands, *args):
+        super(ArrayOperatorBlock, self).__init__()
+        self.args = args
+        self.terms = []
+        for op in operands:
+            if isinstance(op, OverloadedType):
+                self.terms.append(op.get_block_output())
+                self.add_dependency(op.get_block_output())
+            else:
+                self.terms.append(numpy.array(_plain(op)))
+
+    def _values(self):
+        return [_plain(term.get_saved_output()) if not isinstance(term, numpy.ndarray) else term
+                for term in self.terms]
+
+    def adjoint(self, i, values, adj):
+        """Returns the adjoint contribution to operand i, given the output adjoint `adj`."""
+        raise NotImplementedError
+
+    def tangent(self, i, values, tlm):
+        """Returns the tangent linear contribution of operand i, given its tlm value `tlm`."""
+        raise NotImplementedError
+
+    def evaluate_adj(self):
+        adj_input = self.get_outputs()[0].adj_value
+        if adj_input is None:
+            return
+
+        values = self._values()
+        adj_input = _plain(adj_input)
+        for i, term in enumerate(self.terms):
+            if isinstance(term, numpy.ndarray):
+                continue
+            adj = _unbroadcast(self.adjoint(i, values, adj_input), numpy.shape(values[i]))
+            # Adjoint values are accumulated in place, so they must not share memory.
+            term.add_adj_output(float(adj) if numpy.ndim(values[i]) == 0 else numpy.array(adj))
+
+    def evaluate_tlm(self):
+        values = self._values()
+        output = self.get_outputs()[0]
+        for i, term in enumerate(self.terms):
+            if isinstance(term, numpy.ndarray) or term.tlm_value is None:
+                continue
+            tlm = self.tangent(i, values, _plain(term.tlm_value))
+            output.add_tlm_output(float(tlm) if numpy.ndim(tlm) == 0 else numpy.array(tlm))
+
+    def recompute(self):
+        value = self.operator(*(self._values() + list(self.args)))
+        self.get_outputs()[0].checkpoint = float(value) if numpy.ndim(value) == 0 else numpy.asarray(value)
+
+
+class AddBlock(ArrayOperatorBlock):
+    operator = staticmethod(numpy.add)
+
+    def adjoint(self, i, values, adj):
+        return adj
+
+    def tangent(self, i, values, tlm):
+        return numpy.broadcast_to(tlm, numpy.broadcast(*values).shape)
+
+
+class SubBlock(ArrayOperatorBlock):
+    operator = staticmethod(numpy.subtract)
+
+    def adjoint(self, i, values, adj):
+        return adj if i == 0 else -adj
+
+    def tangent(self, i, values, tlm):
+        tlm = tlm if i == 0 else -tlm
+        return numpy.broadcast_to(tlm, numpy.broadcast(*values).shape)
+
+
+class MulBlock(ArrayOperatorBlock):
+    operator = staticmethod(numpy.multiply)
+
+    def adjoint(self, i, values, adj):
+        return adj*values[1 - i]
+
+    def tangent(self, i, values, tlm):
+        return tlm*values[1 - i]
+
+
+class DivBlock(ArrayOperatorBlock):
+    operator = staticmethod(numpy.divide)
+
+    def adjoint(self, i, values, adj):
+        x, y = values
+        return adj/y if i == 0 else -adj*x/y**2
+
+    def tangent(self, i, values, tlm):
+        x, y = values
+        return tlm/y if i == 0 else -tlm*x/y**2
+
+
+class PowBlock(ArrayOperatorBlock):
+    operator = staticmethod(numpy.power)
+
+    def _partial(self, i, values):
+        x, y = values
+        if i == 0:
+            return y*x**(y - 1)
+        return x**y*numpy.log(x)
+
+    def adjoint(self, i, values, adj):
+        return adj*self._partial(i, values)
+
+    def tangent(self, i, values, tlm):
+        return tlm*self._partial(i, values)
+
+
+class NegBlock(ArrayOperatorBlock):
+    operator = staticmethod(numpy.negative)
+
+    def adjoint(self, i, values, adj):
+        return -adj
+
+    def tangent(self, i, values, tlm):
+        return -tlm
+
+
+class GetItemBlock(ArrayOperatorBlock):
+    @staticmethod
+    def operator(x, index):
+        return x[index]
+
+    def adjoint(self, i, values, adj):
+        result = numpy.zeros(numpy.shape(values[0]))
+        numpy.add.at(result, self.args[0], adj)
+        return result
+
+    def tangent(self, i, values, tlm):
+        return tlm[self.args[0]]
+
+
+class SumBlock(ArrayOperatorBlock):
+    @staticmethod
+    def operator(x, axis):
+        return numpy.sum(x, axis=axis)
+
+    def adjoint(self, i, values, adj):
+        axis = self.args[0]
+        shape = numpy.shape(values[0])
+        if axis is not None:
+            adj = numpy.expand_dims(adj, axis)
+        return numpy.broadcast_to(adj, shape)
+
+    def tangent(self, i, values, tlm):
+        return numpy.sum(tlm, axis=self.args[0])
+
+
+class DotBlock(ArrayOperatorBlock):
+    operator = staticmethod(numpy.dot)
+
+    def adjoint(self, i, values, adj):
+        x, y = values
+        # Treat 1-D operands as a row (x) and a column (y) vector.
+        X = numpy.reshape(x, (1, -1)) if numpy.ndim(x) == 1 else x
+        Y = numpy.reshape(y, (-1, 1)) if numpy.ndim(y) == 1 else y
+        adj = numpy.reshape(adj, (X.shape[0], Y.shape[1]))
+        if i == 0:
+            return numpy.dot(adj, Y.T).reshape(numpy.shape(x))
+        return numpy.dot(X.T, adj).reshape(numpy.shape(y))
+
+    def tangent(self, i, values, tlm):
+        x, y = values
+        return numpy.dot(tlm, y) if i == 0 else numpy.dot(x, tlm)
+
+
+class NormBlock(ArrayOperatorBlock):
+    @staticmethod
+    def operator(x):
+        return numpy.sqrt(numpy.vdot(x, x))
+
+    def adjoint(self, i, values, adj):
+        x = values[0]
+        return adj*x/self.operator(x)
+
+    def tangent(self, i, values, tlm):
+        x = values[0]
+        return numpy.vdot(x, tlm)/self.operator(x)
+
+
+_ufunc_blocks = {
+    numpy.add: AddBlock,
+    numpy.subtract: SubBlock,
+    numpy.multiply: MulBlock,
+    numpy.divide: DivBlock,
+    numpy.true_divide: DivBlock,
+    numpy.power: PowBlock,
+    numpy.negative: NegBlock,
+}
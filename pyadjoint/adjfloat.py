@@ -1,6 +1,7 @@
 from .tape import get_working_tape, annotate_tape
 from .block import Block
 from .overloaded_type import OverloadedType
+from .scalar_tape import get_scalar_tape
 from numpy import generic
 
 
@@ -9,9 +10,11 @@ def annotate_operator(operator):
 
     The provided operator is only expected to create the Block that
     corresponds to this operation. The decorator returns a wrapper code
-    that checks whether annotation is needed, ensures all arguments are
-    overloaded, calls the block-creating operator, and puts the Block
-    on tape."""
+    that computes the float result, checks whether annotation is needed,
+    calls the block-creating operator, and puts the Block on tape.
+
+    Arguments that are not overloaded are passed on to the block as they are,
+    and are stored as constant terms instead of as dependencies."""
 
     # the actual float operation is derived from the name of operator
     float_op = getattr(float, operator.__name__)
@@ -21,16 +24,21 @@ def annotate_operator(operator):
         if output is NotImplemented:
             return NotImplemented
 
-        # ensure all arguments are of OverloadedType
-        args = [arg if isinstance(arg, OverloadedType) else self.__class__(arg) for arg in args]
-
         output = self.__class__(output)
-        if annotate_tape():
-            block = operator(self, *args)
+        if not annotate_tape():
+            return output
+
+        scalar_tape = get_scalar_tape()
+        if scalar_tape is not None:
+            scalar_tape.record(operator.__name__, self, args, output)
+            return output
 
-            tape = get_working_tape()
-            tape.add_block(block)
-            block.add_output(output.get_block_output())
+        # Arguments that are not overloaded are constants of the block.
+        block = operator(self, *args)
+
+        tape = get_working_tape()
+        tape.add_block(block)
+        block.add_output(output.get_block_output())
 
         return output
 
@@ -86,6 +94,13 @@ class AdjFloat(OverloadedType, float, generic):
     def _ad_restore_at_checkpoint(self, checkpoint):
         return checkpoint
 
+    def _ad_pack_checkpoint(self, checkpoint):
+        from numpy import array
+        return array([float(checkpoint)])
+
+    def _ad_unpack_checkpoint(self, array):
+        return float(array[0])
+
     def _ad_mul(self, other):
         return self*other
 
@@ -96,6 +111,24 @@ class AdjFloat(OverloadedType, float, generic):
         return float.__mul__(self, other)
 
 
+class _ConstantTerm(object):
+    """A term of a FloatOperatorBlock that is not overloaded.
+
+    Implements the parts of the BlockOutput interface used by the blocks.
+
+    """
+    __slots__ = ["value"]
+
+    def __init__(self, value):
+        self.value = float(value)
+
+    def get_saved_output(self):
+        return self.value
+
+    def add_adj_output(self, value):
+        pass
+
+
 class FloatOperatorBlock(Block):
 
     # the float operator annotated in this Block
@@ -107,9 +140,16 @@ class FloatOperatorBlock(Block):
         # this is because get_dependencies() only returns the terms with
         # duplicates taken out; for evaluation however order and position
         # of the terms is significant
-        self.terms = [arg.get_block_output() for arg in args]
-        for term in self.terms:
-            self.add_dependency(term)
+        self.terms = []
+        for arg in args:
+            if isinstance(arg, OverloadedType):
+                self.terms.append(arg.get_block_output())
+                self.add_dependency(arg.get_block_output())
+            else:
+                self.terms.append(_ConstantTerm(arg))
+
+    def get_adj_reads(self):
+        return self.get_dependencies()
 
     def recompute(self):
         self.get_outputs()[0].checkpoint = self.operator(*(term.get_saved_output() for term in self.terms))
@@ -142,6 +182,9 @@ class AddBlock(FloatOperatorBlock):
 
     operator = staticmethod(float.__add__)
 
+    def get_adj_reads(self):
+        return []
+
     def evaluate_adj(self):
         adj_input = self.get_outputs()[0].get_adj_output()
         if adj_input is None:
@@ -155,6 +198,9 @@ class SubBlock(FloatOperatorBlock):
 
     operator = staticmethod(float.__sub__)
 
+    def get_adj_reads(self):
+        return []
+
     def evaluate_adj(self):
         adj_input = self.get_outputs()[0].get_adj_output()
         if adj_input is None:
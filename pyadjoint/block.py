@@ -8,10 +8,11 @@ class Block(object):
         :func:`evaluate_adj`
 
     """
-    __slots__ = ['_dependencies', '_outputs']
+    __slots__ = ['_dependencies', '_dependency_set', '_outputs']
 
     def __init__(self):
         self._dependencies = []
+        self._dependency_set = set()
         self._outputs = []
 
     def add_dependency(self, dep):
@@ -24,9 +25,10 @@ class Block(object):
             dep (:class:`BlockOutput`): The object to be added.
 
         """
-        if dep not in self._dependencies:  # Can be optimized if we have need for huge lists.
+        if dep not in self._dependency_set:
             dep.save_output(overwrite=False)
             self._dependencies.append(dep)
+            self._dependency_set.add(dep)
 
     def get_dependencies(self):
         """Returns the list of dependencies.
@@ -65,6 +67,30 @@ class Block(object):
         for dep in self._dependencies:
             dep.reset_variables()
 
+    def get_adj_reads(self):
+        """Returns the dependencies and outputs whose saved outputs :meth:`evaluate_adj` reads.
+
+        Only the active dependencies need to be considered, see :attr:`BlockOutput.active`.
+        The checkpoints of other block outputs may be dropped before the reverse sweep,
+        see :class:`pyadjoint.checkpointing.AdjointCheckpointing`. By default every
+        dependency and output is read.
+
+        Returns:
+            :obj:`list`: A list of :class:`BlockOutput` instances.
+
+        """
+        return self._dependencies + self._outputs
+
+    def get_stored_data(self):
+        """Returns the objects the block keeps for later sweeps, such as solutions reused by
+        :meth:`evaluate_hessian`. They are counted by :class:`pyadjoint.memory.MemoryReport`.
+
+        Returns:
+            :obj:`list`: A list of objects. By default empty.
+
+        """
+        return []
+
     def evaluate_adj(self):
         """This method must be overriden.
         
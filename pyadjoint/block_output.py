@@ -1,6 +1,25 @@
+import threading
+import weakref
+
+from .checkpoint_storage import StoredCheckpoint
+
+# Collects the adjoint contributions of a block evaluated in a worker thread,
+# see pyadjoint.parallel.
+_adj_contributions = threading.local()
+
+
 class BlockOutput(object):
     """References a block output variable.
 
+    The attribute `active` is False while the output does not depend on the controls
+    of a reverse sweep, see :meth:`pyadjoint.tape.Tape.mark_active`.
+
+    Caches of values derived from the saved output can be registered with
+    :meth:`add_dependent_cache`. They are cleared when the checkpoint is replaced or released.
+
+    A checkpoint released with :meth:`drop_checkpoint` must be recomputed before the saved
+    output is read again, see :meth:`get_saved_output`.
+
     """
 
     def __init__(self, output):
@@ -8,9 +27,54 @@ class BlockOutput(object):
         self.adj_value = None
         self.tlm_value = None
         self.hessian_value = None
+        self.active = True
+        self._checkpoint = None
+        self._dropped = False
+        self._dependent_caches = None
+
+    @property
+    def checkpoint(self):
+        checkpoint = self._checkpoint
+        if isinstance(checkpoint, StoredCheckpoint):
+            return checkpoint.load()
+        return checkpoint
+
+    @checkpoint.setter
+    def checkpoint(self, value):
+        tape = getattr(self.output, "tape", None)
+        if value is not None and tape is not None:
+            value = tape.get_checkpoint_storage().store(self.output, value)
+        self._checkpoint = value
+        self._dropped = False
+        if self._dependent_caches:
+            for cache in list(self._dependent_caches):
+                cache.clear()
+
+    def drop_checkpoint(self):
+        """Releases the checkpoint, which a block on the tape can recompute when it is needed again."""
         self.checkpoint = None
+        self._dropped = True
+
+    def add_dependent_cache(self, cache):
+        """Registers a cache of values derived from the saved output.
+
+        The cache is cleared when the checkpoint is replaced or released, so that it does not
+        keep old checkpoints alive. It is referenced weakly.
+
+        Args:
+            cache (object): The cache. It must have a method `clear` that takes no arguments.
+
+        """
+        if self._dependent_caches is None:
+            self._dependent_caches = weakref.WeakSet()
+        self._dependent_caches.add(cache)
 
     def add_adj_output(self, val):
+        contributions = getattr(_adj_contributions, "buffer", None)
+        if contributions is not None:
+            contributions.append((self, val))
+            return
+
         if self.adj_value is None:
             self.adj_value = val
         else:
@@ -45,15 +109,18 @@ class BlockOutput(object):
         return self.output
 
     def save_output(self, overwrite=True):
-        if overwrite or not self.checkpoint:
+        if overwrite or self._checkpoint is None:
             self.checkpoint = self.output._ad_create_checkpoint()
 
     def get_saved_output(self):
-        if self.checkpoint is not None:
-            return self.output._ad_restore_at_checkpoint(self.checkpoint)
-        else:
-            return self.output
+        checkpoint = self.checkpoint
+        if checkpoint is not None:
+            return self.output._ad_restore_at_checkpoint(checkpoint)
+        if self._dropped:
+            # The live output may have changed since, so it is not a substitute.
+            raise RuntimeError("The checkpoint of {} has been dropped and not recomputed.".format(self))
+        # Nothing was ever checkpointed.
+        return self.output
 
     def __str__(self):
         return str(self.output)
-
@@ -0,0 +1,315 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+import zlib
+
+import numpy
+
+
+class StoredCheckpoint(object):
+    """Base class for checkpoints held by a :class:`CheckpointStorage`.
+
+    Abstract methods
+        :func:`restore`
+
+    """
+    def __init__(self, output):
+        self.output = output
+        self._ref = None
+
+    def load(self):
+        """Returns the checkpoint.
+
+        The same object is returned for as long as it is referenced somewhere else,
+        so that forms built from a checkpoint keep referring to one object.
+
+        """
+        checkpoint = self._ref() if self._ref is not None else None
+        if checkpoint is None:
+            checkpoint = self.restore()
+            try:
+                self._ref = weakref.ref(checkpoint)
+            except TypeError:
+                # Builtin types (float) cannot be weakly referenced.
+                pass
+        return checkpoint
+
+    def restore(self):
+        """This method must be overridden.
+
+        Should recreate the checkpoint from the stored data.
+
+        """
+        raise NotImplementedError
+
+    def nbytes(self, seen=None):
+        """Returns the number of bytes of stored data that this checkpoint holds in memory.
+
+        The loaded checkpoint is not included. The default is 0, for data that is not held in memory.
+
+        Args:
+            seen (set|None): Ids of objects that are already counted, as for :func:`pyadjoint.memory.nbytes`.
+
+        Returns:
+            int: The number of bytes.
+
+        """
+        return 0
+
+
+class CheckpointStorage(object):
+    """Base class for checkpoint storage backends.
+
+    The storage of a tape decides how the checkpoints of :class:`BlockOutput` instances are kept.
+    The default (this class) keeps the checkpoints in memory as they are.
+
+    """
+    def store(self, output, checkpoint):
+        """Stores a checkpoint.
+
+        Args:
+            output (OverloadedType): The object the checkpoint was created from.
+            checkpoint (object): The checkpoint, as returned by `output._ad_create_checkpoint`.
+
+        Returns:
+            object: Either the checkpoint itself, or a :class:`StoredCheckpoint`.
+
+        """
+        return checkpoint
+
+
+class _DiskCheckpoint(StoredCheckpoint):
+    def __init__(self, output, storage, filename):
+        super(_DiskCheckpoint, self).__init__(output)
+        # Keeps the (possibly temporary) directory alive.
+        self.storage = storage
+        self.filename = filename
+
+    def restore(self):
+        return self.output._ad_unpack_checkpoint(numpy.load(self.filename, mmap_mode="r"))
+
+    def __del__(self):
+        try:
+            os.remove(self.filename)
+        except OSError:
+            pass
+
+
+class DiskCheckpointStorage(CheckpointStorage):
+    """Stores checkpoints in memory-mapped NumPy files.
+
+    Only checkpoints of types that implement `_ad_pack_checkpoint` are written to disk,
+    others are kept in memory. A file is removed when the checkpoint is no longer referenced.
+
+    Args:
+        directory (str|None): The directory for the checkpoint files. If None (default),
+            a temporary directory is created, and removed with the storage.
+        min_size (int): Checkpoints smaller than this (in bytes) are kept in memory. Default 1024.
+
+    """
+    def __init__(self, directory=None, min_size=1024):
+        self._temporary = directory is None
+        if self._temporary:
+            directory = tempfile.mkdtemp(prefix="pyadjoint-")
+        elif not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.min_size = min_size
+
+    def store(self, output, checkpoint):
+        try:
+            array = output._ad_pack_checkpoint(checkpoint)
+        except NotImplementedError:
+            return checkpoint
+
+        if array.nbytes < self.min_size:
+            return checkpoint
+
+        fd, filename = tempfile.mkstemp(suffix=".npy", dir=self.directory)
+        with os.fdopen(fd, "wb") as f:
+            numpy.save(f, array)
+        return _DiskCheckpoint(output, self, filename)
+
+    def __del__(self):
+        if self._temporary:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class _SharedBuffer(object):
+    # Holds a read-only array. It is freed when the last checkpoint using it is gone.
+    __slots__ = ["array", "__weakref__"]
+
+    def __init__(self, array):
+        self.array = array
+
+
+class _SharedCheckpoint(StoredCheckpoint):
+    def __init__(self, output, buffer):
+        super(_SharedCheckpoint, self).__init__(output)
+        self.buffer = buffer
+
+    def restore(self):
+        return self.output._ad_unpack_checkpoint(self.buffer.array)
+
+    def nbytes(self, seen=None):
+        # The buffer is counted once for all the checkpoints sharing it.
+        if seen is not None:
+            if id(self.buffer) in seen:
+                return 0
+            seen.add(id(self.buffer))
+        return self.buffer.array.nbytes
+
+
+class DeduplicatingCheckpointStorage(CheckpointStorage):
+    """Keeps one copy in memory of checkpoints with identical data.
+
+    The data of a checkpoint is identified by a hash of its packed array, see `_ad_pack_checkpoint`.
+    Checkpoints with the same data share one read-only buffer, which is freed when the last
+    checkpoint using it is no longer referenced. A checkpoint is recreated from the buffer when
+    it is loaded, so changes to a loaded checkpoint do not affect the buffer (copy-on-write).
+    Checkpoints of types that do not implement `_ad_pack_checkpoint` are kept as they are.
+
+    This saves memory for models where many checkpoints are equal, for example
+    coefficients that are constant in time.
+
+    """
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._buffers = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def store(self, output, checkpoint):
+        try:
+            array = output._ad_pack_checkpoint(checkpoint)
+        except NotImplementedError:
+            return checkpoint
+
+        array = numpy.ascontiguousarray(array)
+        digest = hashlib.sha1(array.tobytes())
+        digest.update(str((array.dtype.str, array.shape)).encode())
+        key = digest.hexdigest()
+
+        with self._lock:
+            buffer = self._buffers.get(key)
+            if buffer is not None and numpy.array_equal(buffer.array, array):
+                self.hits += 1
+            else:
+                self.misses += 1
+                array = numpy.array(array, copy=True)
+                array.flags.writeable = False
+                buffer = _SharedBuffer(array)
+                if key not in self._buffers:
+                    self._buffers[key] = buffer
+        return _SharedCheckpoint(output, buffer)
+
+    @property
+    def nbytes(self):
+        """The number of bytes held by the shared buffers."""
+        with self._lock:
+            return sum(buffer.array.nbytes for buffer in list(self._buffers.values()))
+
+
+def _lz4():
+    try:
+        import lz4.frame
+    except ImportError:
+        raise ImportError("The lz4 codec needs the lz4 package.")
+    return lz4.frame
+
+
+# Lossless codecs compress the bytes of the array, lossy codecs store it with a smaller float type.
+_LOSSLESS_CODECS = {
+    "zlib": (lambda data: zlib.compress(data, 1), zlib.decompress),
+    "lz4": (lambda data: _lz4().compress(data), lambda data: _lz4().decompress(data)),
+}
+_LOSSY_CODECS = {
+    "float32": numpy.float32,
+    "float16": numpy.float16,
+}
+
+
+class _CompressedCheckpoint(StoredCheckpoint):
+    def __init__(self, output, codec, data, dtype, shape):
+        super(_CompressedCheckpoint, self).__init__(output)
+        self.codec = codec
+        self.data = data
+        self.dtype = dtype
+        self.shape = shape
+
+    def restore(self):
+        if self.codec in _LOSSY_CODECS:
+            array = self.data.astype(self.dtype)
+        else:
+            decompress = _LOSSLESS_CODECS[self.codec][1]
+            array = numpy.frombuffer(decompress(self.data), dtype=self.dtype).reshape(self.shape)
+        return self.output._ad_unpack_checkpoint(array)
+
+    def nbytes(self, seen=None):
+        if isinstance(self.data, numpy.ndarray):
+            return self.data.nbytes
+        return len(self.data)
+
+
+class CompressedCheckpointStorage(CheckpointStorage):
+    """Keeps checkpoints compressed in memory.
+
+    Lossless codecs compress the bytes of the packed array (see `_ad_pack_checkpoint`):
+    "zlib", and "lz4" if the lz4 package is installed. Lossy codecs store the array
+    with a smaller float type: "float32" and "float16". A lossy checkpoint whose largest
+    error exceeds `tolerance` times the largest absolute value of the data (for example
+    because it overflows float16) is stored with zlib instead.
+
+    Checkpoints of types that do not implement `_ad_pack_checkpoint` are kept as they are.
+
+    Args:
+        codec (str): The codec. Default "zlib".
+        codecs (dict): Codecs for particular overloaded types, which override `codec`,
+            for example ``{Function: "float16"}``. Default None, for no overrides.
+        tolerance (float): The relative error allowed for lossy codecs. Default 1e-3.
+        min_size (int): Checkpoints smaller than this (in bytes) are kept as they are. Default 1024.
+
+    """
+    def __init__(self, codec="zlib", codecs=None, tolerance=1e-3, min_size=1024):
+        codecs = {} if codecs is None else dict(codecs)
+        for name in [codec] + list(codecs.values()):
+            if name not in _LOSSLESS_CODECS and name not in _LOSSY_CODECS:
+                raise ValueError("Unknown checkpoint codec '{}'.".format(name))
+            if name == "lz4":
+                _lz4()
+        self.codec = codec
+        self.codecs = codecs
+        self.tolerance = tolerance
+        self.min_size = min_size
+
+    def _get_codec(self, output):
+        for cls in type(output).__mro__:
+            if cls in self.codecs:
+                return self.codecs[cls]
+        return self.codec
+
+    def store(self, output, checkpoint):
+        try:
+            array = output._ad_pack_checkpoint(checkpoint)
+        except NotImplementedError:
+            return checkpoint
+
+        array = numpy.ascontiguousarray(array)
+        if array.nbytes < self.min_size:
+            return checkpoint
+
+        codec = self._get_codec(output)
+        if codec in _LOSSY_CODECS:
+            with numpy.errstate(all="ignore"):
+                data = array.astype(_LOSSY_CODECS[codec])
+                error = numpy.max(numpy.abs(data.astype(array.dtype) - array)) if array.size else 0.
+            bound = self.tolerance*(numpy.max(numpy.abs(array)) if array.size else 0.)
+            if error <= bound:
+                return _CompressedCheckpoint(output, codec, data, array.dtype, array.shape)
+            codec = "zlib"
+
+        compress = _LOSSLESS_CODECS[codec][0]
+        return _CompressedCheckpoint(output, codec, compress(array.tobytes()), array.dtype, array.shape)
@@ -0,0 +1,278 @@
+from .tape import stop_annotating
+
+
+def binomial(snapshots, repetitions):
+    """Returns the maximal number of steps that can be reversed with the given resources.
+
+    This is the binomial coefficient beta(s, t) = (s + t)!/(s!t!) from Griewank's revolve
+    algorithm, where s is the number of snapshots and t the number of times each
+    step may be recomputed.
+
+    """
+    result = 1
+    for i in range(1, snapshots + 1):
+        result = result*(repetitions + i)//i
+    return result
+
+
+def optimal_advance(steps, snapshots):
+    """Returns the number of steps to advance before taking the next snapshot.
+
+    Args:
+        steps (int): The number of steps left to reverse. Must be at least 2.
+        snapshots (int): The number of free snapshots. Must be at least 1.
+
+    Returns:
+        int: The optimal number of steps to advance, as given by the binomial schedule.
+
+    """
+    repetitions = 0
+    while binomial(snapshots, repetitions) < steps:
+        repetitions += 1
+    return max(1, steps - binomial(snapshots - 1, repetitions))
+
+
+class BinomialCheckpointing(object):
+    """Binomial (revolve) checkpointing of the block outputs on a tape.
+
+    Each block on the tape is one step. A snapshot at step i holds the checkpoints of every
+    :class:`BlockOutput` that is produced before block i and used by block i or later.
+    Block outputs that are not produced by a block on the tape (user created values, such
+    as controls) are never dropped.
+
+    Between sweeps only the snapshots of the binomial schedule are kept. The reverse sweep
+    recomputes the missing checkpoints from the closest snapshot using :meth:`Block.recompute`,
+    and may temporarily hold up to `snapshots` additional snapshots.
+
+    Args:
+        snapshots (int): The number of snapshots to keep between sweeps.
+
+    """
+    def __init__(self, snapshots):
+        if snapshots < 1:
+            raise ValueError("Binomial checkpointing needs at least one snapshot.")
+        self.snapshots = snapshots
+        self._num_blocks = None
+        self._positions = set()
+        self._held = set()
+        self._active = None
+
+    def reset(self):
+        self._num_blocks = None
+
+    def _update(self, tape):
+        blocks = tape.get_blocks()
+        if self._num_blocks == len(blocks):
+            return
+        self._num_blocks = len(blocks)
+
+        # The snapshots of the new schedule may have been dropped by the previous one,
+        # so the checkpoints are recomputed from the leaves before the new schedule drops them.
+        if any(output._checkpoint is None for block in blocks for output in block.get_outputs()):
+            with stop_annotating():
+                for block in blocks:
+                    tape._run("replay", block, "recompute")
+
+        self._positions = set([0])
+        start, snapshots = 0, self.snapshots
+        while len(blocks) - start > 1 and snapshots > 0:
+            start += optimal_advance(len(blocks) - start, snapshots)
+            self._positions.add(start)
+            snapshots -= 1
+        self._held = set(self._positions)
+
+    def _pinned(self, tape, output, producer):
+        consumers = tape.get_consumer_indices(output)
+        last_use = consumers[-1] if consumers else producer
+        for position in self._held:
+            if producer < position <= last_use:
+                return True
+        return False
+
+    def _release(self, tape, start, end):
+        blocks = tape.get_blocks()
+        for i in range(start, end):
+            for output in blocks[i].get_outputs():
+                if tape.get_producer_index(output) == i and not self._pinned(tape, output, i):
+                    output.drop_checkpoint()
+
+    def drop_checkpoints(self, tape):
+        """Drops every checkpoint that is not part of a snapshot of the schedule."""
+        self._update(tape)
+        self._release(tape, 0, len(tape.get_blocks()))
+
+    def replay_start(self, tape, block_idx):
+        """Returns the index of the last snapshot at or before `block_idx`."""
+        self._update(tape)
+        return max(i for i in self._positions if i <= block_idx)
+
+    def restore(self, tape):
+        """Recomputes every checkpoint on the tape."""
+        self._update(tape)
+        with stop_annotating():
+            for block in tape.get_blocks():
+                tape._run("tlm", block, "recompute")
+
+    def evaluate_adj(self, tape, last_block=0, indices=None):
+        """Runs the reverse sweep down to `last_block`, recomputing checkpoints as needed.
+
+        If `indices` is given, only the adjoints of the blocks with these indices are evaluated.
+
+        """
+        self._update(tape)
+        self._active = None if indices is None else set(indices)
+        with stop_annotating():
+            self._reverse(tape, 0, len(tape.get_blocks()), self.snapshots, last_block)
+        self._held = set(self._positions)
+        self._active = None
+
+    def _advance(self, tape, start, end):
+        blocks = tape.get_blocks()
+        for i in range(start, end):
+            tape._run("adjoint", blocks[i], "recompute")
+
+    def _evaluate_block(self, tape, i):
+        if self._active is None or i in self._active:
+            tape._evaluate_adj(tape.get_blocks()[i])
+
+    def _reverse(self, tape, start, end, snapshots, last_block):
+        # The snapshot at `start` is available.
+        if end <= last_block:
+            return
+
+        blocks = tape.get_blocks()
+        if end - start == 1:
+            tape._run("adjoint", blocks[start], "recompute")
+            self._evaluate_block(tape, start)
+            self._release(tape, start, end)
+            return
+
+        if snapshots == 0:
+            for i in range(end - 1, max(start, last_block) - 1, -1):
+                self._advance(tape, start, i + 1)
+                self._evaluate_block(tape, i)
+                self._release(tape, start, i + 1)
+            return
+
+        mid = start + optimal_advance(end - start, snapshots)
+        temporary = mid not in self._held
+        if temporary:
+            self._advance(tape, start, mid)
+            self._held.add(mid)
+            self._release(tape, start, mid)
+
+        self._reverse(tape, mid, end, snapshots - 1, last_block)
+
+        if temporary:
+            self._held.remove(mid)
+            self._release(tape, start, mid)
+        self._reverse(tape, start, mid, snapshots, last_block)
+
+
+class AdjointCheckpointing(object):
+    """Only keeps the checkpoints that the reverse sweep reads.
+
+    Each block declares which of its dependencies and outputs its adjoint reads through
+    :meth:`Block.get_adj_reads`, given the dependencies that are active for the controls
+    (see :meth:`pyadjoint.tape.Tape.mark_active`). Between sweeps the checkpoints of the
+    other block outputs produced by blocks on the tape are dropped. Block outputs that are
+    not produced by a block on the tape are never dropped.
+
+    A reverse sweep that reads dropped checkpoints, for example one with other controls,
+    and the tangent linear and Hessian sweeps recompute the checkpoints from the start
+    of the tape first.
+
+    Args:
+        sources (list[BlockOutput]): The block outputs of the controls.
+
+    """
+    def __init__(self, sources):
+        self.sources = list(sources)
+        self._num_blocks = None
+        self._needed = set()
+        self._reads = {}
+
+    def reset(self):
+        self._num_blocks = None
+        self._reads = {}
+
+    def _get_reads(self, block):
+        # The reads of a block only change with the activity of its dependencies.
+        key = tuple(dep.active for dep in block.get_dependencies())
+        cached = self._reads.get(block)
+        if cached is None or cached[0] != key:
+            cached = (key, block.get_adj_reads())
+            self._reads[block] = cached
+        return cached[1]
+
+    def _update(self, tape):
+        blocks = tape.get_blocks()
+        if self._num_blocks == len(blocks):
+            return
+        self._num_blocks = len(blocks)
+
+        flags = [(dep, dep.active) for block in blocks for dep in block.get_dependencies()]
+        tape.mark_active(self.sources)
+        try:
+            self._needed = set()
+            for block in blocks:
+                self._needed.update(self._get_reads(block))
+        finally:
+            for dep, active in flags:
+                dep.active = active
+
+    def _recompute(self, tape, phase):
+        with stop_annotating():
+            for block in tape.get_blocks():
+                tape._run(phase, block, "recompute")
+
+    def drop_checkpoints(self, tape):
+        """Drops the checkpoints of the block outputs that the reverse sweep does not read."""
+        self._update(tape)
+        for i, block in enumerate(tape.get_blocks()):
+            for output in block.get_outputs():
+                if output not in self._needed and tape.get_producer_index(output) == i:
+                    output.drop_checkpoint()
+
+    def replay_start(self, tape, block_idx):
+        """Returns the index of the first block from which the checkpoints of `block_idx` and onwards can be recomputed."""
+        blocks = tape.get_blocks()
+        start = block_idx
+        missing = set()
+        for i in range(len(blocks) - 1, -1, -1):
+            outputs = blocks[i].get_outputs()
+            if i < start and not any(output in missing for output in outputs):
+                continue
+            start = min(start, i)
+            missing.difference_update(outputs)
+            missing.update(dep for dep in blocks[i].get_dependencies() if dep._checkpoint is None)
+        return start
+
+    def restore(self, tape):
+        """Recomputes every checkpoint on the tape."""
+        self._update(tape)
+        self._recompute(tape, "tlm")
+
+    def evaluate_adj(self, tape, last_block=0, indices=None):
+        """Runs the reverse sweep down to `last_block`, recomputing the checkpoints first if some it reads are dropped.
+
+        If `indices` is given, only the adjoints of the blocks with these indices are evaluated.
+
+        """
+        self._update(tape)
+        blocks = tape.get_blocks()
+        if indices is None:
+            indices = range(last_block, len(blocks))
+        indices = [i for i in indices if i >= last_block]
+
+        missing = any(block_output._checkpoint is None
+                      for i in indices for block_output in self._get_reads(blocks[i]))
+        if missing:
+            self._recompute(tape, "adjoint")
+
+        with stop_annotating():
+            for i in reversed(indices):
+                tape._evaluate_adj(blocks[i])
+
+        if missing:
+            self.drop_checkpoints(tape)
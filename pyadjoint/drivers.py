@@ -1,13 +1,41 @@
 from .tape import get_working_tape, stop_annotating
 
 
-def compute_gradient(J, m, block_idx=0, options={}, tape=None):
+def compute_gradient(J, m, block_idx=0, options={}, tape=None, prune=False, threads=None, hessian=False):
+    """Computes the gradient of J with respect to m.
+
+    Args:
+        J (OverloadedType): The functional.
+        m (OverloadedType|list[OverloadedType]): The control, or a list of controls.
+        block_idx (int): The index of the last block to evaluate. Default 0.
+        options (dict): A dictionary of options, passed to the `get_derivative` method of the controls.
+        tape (Tape): The tape to use. Default is the working tape.
+        prune (bool): If True, only the blocks on a path from the controls to J are evaluated.
+            Default False.
+        threads (int|None): If given, independent blocks are evaluated in parallel by this
+            many threads. Default None.
+        hessian (bool): If True, the blocks keep what a following :class:`Hessian` evaluation
+            reuses, such as the first order adjoint solutions. Default False.
+
+    Returns:
+        OverloadedType|list[OverloadedType]: The derivative, or a list of derivatives if m is a list.
+
+    """
     tape = get_working_tape() if tape is None else tape
     tape.reset_variables()
     J.set_initial_adj_input(1.0)
 
-    with stop_annotating():
-        tape.evaluate(block_idx)
+    controls = m if isinstance(m, (list, tuple)) else [m]
+    indices = None
+    if prune:
+        indices = tape.get_path_indices([c.original_block_output for c in controls], J.block_output)
+
+    tape.mark_active([c.original_block_output for c in controls])
+    try:
+        with stop_annotating():
+            tape.evaluate(block_idx, indices, threads, hessian)
+    finally:
+        tape.reset_activity()
 
     if isinstance(m, (list, tuple)):
         return [i.get_derivative(options=options) for i in m]
@@ -15,6 +43,91 @@ def compute_gradient(J, m, block_idx=0, options={}, tape=None):
     return m.get_derivative(options=options)
 
 
+def compute_jacobian(Js, m, block_idx=0, options={}, tape=None, prune=False):
+    """Computes the gradients of several functionals with respect to m in one reverse sweep.
+
+    The functionals are seeded together, see :meth:`pyadjoint.tape.Tape.evaluate_batch`,
+    so each block solves its adjoint equation for all functionals with the same operator.
+
+    Args:
+        Js (list[OverloadedType]): The functionals.
+        m (OverloadedType|list[OverloadedType]): The control, or a list of controls.
+        block_idx (int): The index of the last block to evaluate. Default 0.
+        options (dict): A dictionary of options, passed to the `get_derivative` method of the controls.
+        tape (Tape): The tape to use. Default is the working tape.
+        prune (bool): If True, only the blocks on a path from the controls to a functional are evaluated.
+            Default False.
+
+    Returns:
+        list: For each functional, the derivative, or a list of derivatives if m is a list.
+
+    """
+    tape = get_working_tape() if tape is None else tape
+    tape.reset_variables()
+
+    controls = m if isinstance(m, (list, tuple)) else [m]
+    indices = None
+    if prune:
+        indices = set()
+        for J in Js:
+            indices.update(tape.get_path_indices([c.original_block_output for c in controls], J.block_output))
+        indices = sorted(indices)
+
+    tape.mark_active([c.original_block_output for c in controls])
+    try:
+        with stop_annotating():
+            adj_values = tape.evaluate_batch([{J.block_output: 1.0} for J in Js], block_idx, indices)
+    finally:
+        tape.reset_activity()
+
+    jacobian = []
+    for values in adj_values:
+        derivatives = []
+        for c in controls:
+            c.original_block_output.adj_value = values.get(c.original_block_output)
+            derivatives.append(c.get_derivative(options=options))
+            c.original_block_output.adj_value = None
+        jacobian.append(derivatives if isinstance(m, (list, tuple)) else derivatives[0])
+    return jacobian
+
+
+def compute_jacobian_action(Js, m, m_dots, tape=None):
+    """Computes the directional derivatives of one or several outputs in several directions.
+
+    This is the forward (tangent linear) mode, which is cheaper than :func:`compute_jacobian`
+    when there are fewer directions than outputs. The directions are propagated together
+    through the tape, see :meth:`pyadjoint.tape.Tape.evaluate_tlm_batch`, so each block
+    solves its tangent linear equation for all directions with the same operator.
+
+    Args:
+        Js (OverloadedType|list[OverloadedType]): The output, or a list of outputs.
+        m (OverloadedType|list[OverloadedType]): The control, or a list of controls.
+        m_dots (list): The directions. If m is a list, each direction is a list with
+            one value per control.
+        tape (Tape): The tape to use. Default is the working tape.
+
+    Returns:
+        list: The tlm values of the output, one per direction, or such a list for each
+            output if Js is a list. A tlm value is None if the output does not depend on the controls.
+
+    """
+    tape = get_working_tape() if tape is None else tape
+    outputs = Js if isinstance(Js, (list, tuple)) else [Js]
+    controls = m if isinstance(m, (list, tuple)) else [m]
+
+    tlm_inputs = []
+    for m_dot in m_dots:
+        m_dot = m_dot if isinstance(m, (list, tuple)) else [m_dot]
+        tlm_inputs.append(dict((c.original_block_output, value) for c, value in zip(controls, m_dot)))
+
+    with stop_annotating():
+        tlm_values = tape.evaluate_tlm_batch(tlm_inputs)
+    tape.drop_checkpoints()
+
+    jacobian_action = [[values.get(J.block_output) for values in tlm_values] for J in outputs]
+    return jacobian_action if isinstance(Js, (list, tuple)) else jacobian_action[0]
+
+
 class Hessian(object):
     def __init__(self, J, m):
         self.tape = get_working_tape()
@@ -31,3 +144,26 @@ class Hessian(object):
         self.tape.evaluate_hessian()
 
         return self.control._ad_convert_type(self.control.original_block_output.hessian_value, options)
+
+    def apply_batch(self, m_dots, options={}):
+        """Returns the actions of the Hessian in several directions.
+
+        The directions are propagated together through the tape, see
+        :meth:`pyadjoint.tape.Tape.evaluate_tlm_batch`. As for :meth:`__call__`, the adjoint
+        values on the tape must be those of a gradient computation at the current point.
+
+        Args:
+            m_dots (list[OverloadedType]): The directions.
+            options (dict): A dictionary of options, passed to `_ad_convert_type` of the control.
+
+        Returns:
+            list[OverloadedType]: The Hessian actions, one per direction.
+
+        """
+        control = self.control.original_block_output
+        with stop_annotating():
+            tlm_values = self.tape.evaluate_tlm_batch([{control: m_dot} for m_dot in m_dots])
+            hessian_values = self.tape.evaluate_hessian_batch(
+                tlm_values, [{self.functional.block_output: 0} for m_dot in m_dots])
+
+        return [self.control._ad_convert_type(values.get(control), options) for values in hessian_values]
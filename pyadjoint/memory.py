@@ -0,0 +1,127 @@
+import sys
+
+import numpy
+
+from .checkpoint_storage import StoredCheckpoint
+
+KINDS = ("checkpoint", "adj_value", "tlm_value", "hessian_value", "block_data")
+
+# The kinds held by the block outputs, the data kept by the blocks is counted as "block_data".
+OUTPUT_KINDS = KINDS[:-1]
+
+
+def nbytes(value, seen=None):
+    """Estimates the number of bytes held by a checkpoint or an adjoint, tlm or hessian value.
+
+    Vectors, Functions and Constants are measured by the size of their (local) data,
+    containers by the sum of their items. Other objects fall back to `sys.getsizeof`.
+
+    Args:
+        value (object): The object to measure.
+        seen (set|None): Ids of objects that are already counted, and are counted as 0 bytes.
+            The ids of measured objects are added to the set.
+
+    Returns:
+        int: The estimated number of bytes.
+
+    """
+    if value is None:
+        return 0
+    if seen is not None:
+        if id(value) in seen:
+            return 0
+        seen.add(id(value))
+
+    if isinstance(value, StoredCheckpoint):
+        # The data held by the storage, and the loaded checkpoint while it is referenced.
+        loaded = value._ref() if value._ref is not None else None
+        return value.nbytes(seen) + nbytes(loaded, seen)
+    if isinstance(value, numpy.ndarray):
+        return value.nbytes
+    if isinstance(value, (float, int, bool)):
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sum(nbytes(v, seen) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(nbytes(v, seen) for v in value)
+    if hasattr(value, "local_size"):
+        return value.local_size()*numpy.dtype(numpy.float64).itemsize
+    if callable(getattr(value, "vector", None)):
+        return nbytes(value.vector(), seen)
+    if callable(getattr(value, "values", None)):
+        return numpy.asarray(value.values()).nbytes
+    return sys.getsizeof(value)
+
+
+class MemoryReport(object):
+    """The memory held by the block outputs of a tape.
+
+    The bytes are estimated with :func:`nbytes`, and split into the kinds "checkpoint",
+    "adj_value", "tlm_value" and "hessian_value" of the block outputs, and "block_data"
+    for the data the blocks keep themselves, see :meth:`pyadjoint.block.Block.get_stored_data`.
+    Objects shared by several block outputs or blocks are only counted once.
+
+    Attributes:
+        total (int): The total number of bytes.
+        totals (dict): Maps each kind to its number of bytes.
+        by_block (dict): Maps block class names to dicts from kind to bytes,
+            counting the outputs of the blocks of that class.
+        by_range (list[tuple]): Tuples (start, end, dict from kind to bytes), counting
+            the outputs of the blocks with indices in [start, end).
+        leaves (dict): Maps each kind to the bytes held by block outputs that are not
+            produced by a block on the tape, such as controls.
+
+    Args:
+        tape (Tape): The tape to measure.
+        block_range (int): The number of blocks per entry of `by_range`. Default 100.
+
+    """
+    def __init__(self, tape, block_range=100):
+        self.totals = _new_totals()
+        self.by_block = {}
+        self.by_range = []
+        self.leaves = _new_totals()
+
+        seen = set()
+        blocks = tape.get_blocks()
+        for start in range(0, len(blocks), block_range):
+            end = min(start + block_range, len(blocks))
+            totals = _new_totals()
+            for block in blocks[start:end]:
+                block_totals = self.by_block.setdefault(type(block).__name__, _new_totals())
+                for output in block.get_outputs():
+                    self._add(output, seen, totals, block_totals)
+                self._add_size("block_data", nbytes(block.get_stored_data(), seen), totals, block_totals)
+
+                for dep in block.get_dependencies():
+                    if tape.get_producer_index(dep) is None:
+                        self._add(dep, seen, self.leaves)
+            self.by_range.append((start, end, totals))
+
+        self.total = sum(self.totals.values())
+
+    def _add(self, output, seen, *groups):
+        for kind in OUTPUT_KINDS:
+            value = output._checkpoint if kind == "checkpoint" else getattr(output, kind)
+            self._add_size(kind, nbytes(value, seen), *groups)
+
+    def _add_size(self, kind, size, *groups):
+        if size:
+            self.totals[kind] += size
+            for group in groups:
+                group[kind] += size
+
+    def __str__(self):
+        row = "{:<40}" + " {:>14}"*len(KINDS)
+        lines = [row.format("", *KINDS)]
+        lines.append(row.format("total", *[self.totals[kind] for kind in KINDS]))
+        lines.append(row.format("leaves", *[self.leaves[kind] for kind in KINDS]))
+        for name in sorted(self.by_block):
+            lines.append(row.format(name, *[self.by_block[name][kind] for kind in KINDS]))
+        for start, end, totals in self.by_range:
+            lines.append(row.format("blocks {}-{}".format(start, end - 1), *[totals[kind] for kind in KINDS]))
+        return "\n".join(lines)
+
+
+def _new_totals():
+    return dict((kind, 0) for kind in KINDS)
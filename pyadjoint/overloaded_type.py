@@ -9,6 +9,11 @@ class OverloadedType(object):
     it can be referenced by blocks as well as overload basic mathematical
     operations such as __mul__, __add__, where they are needed.
 
+    The block output of an object is only created when it is first used,
+    so that objects that are never annotated (for example while annotation is paused)
+    carry no block output. Subclasses with other base classes that define __getattr__
+    before OverloadedType in the MRO must forward these lookups to OverloadedType.__getattr__.
+
     Abstract methods:
         :func:`adj_update_value`
 
@@ -21,9 +26,22 @@ class OverloadedType(object):
         else:
             self.tape = get_working_tape()
 
-        self.original_block_output = self.create_block_output()
+    def __getattr__(self, name):
+        # Only called if the attribute is not found otherwise.
+        if name in ("block_output", "original_block_output"):
+            block_output = BlockOutput(self)
+            self.original_block_output = block_output
+            self.set_block_output(block_output)
+            return block_output
+
+        getattr_ = getattr(super(OverloadedType, self), "__getattr__", None)
+        if getattr_ is None:
+            raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+        return getattr_(name)
 
     def create_block_output(self):
+        # The original block output must exist before it is replaced.
+        self.original_block_output
         block_output = BlockOutput(self)
         self.set_block_output(block_output)
         return block_output
@@ -78,6 +96,38 @@ class OverloadedType(object):
         """
         raise NotImplementedError
 
+    def _ad_pack_checkpoint(self, checkpoint):
+        """This method may be overridden.
+
+        Should implement a way to convert a checkpoint created by _ad_create_checkpoint
+        to a flat NumPy array. This is used by checkpoint storage backends.
+
+        Args:
+            checkpoint (:obj:`object`): The checkpoint to convert.
+
+        Returns:
+            :obj:`numpy.ndarray`: The data of the checkpoint.
+
+        Raises:
+            NotImplementedError: If the checkpoint cannot be converted. It is then kept as it is.
+
+        """
+        raise NotImplementedError
+
+    def _ad_unpack_checkpoint(self, array):
+        """This method may be overridden.
+
+        Should implement the inverse of _ad_pack_checkpoint.
+
+        Args:
+            array (:obj:`numpy.ndarray`): The data returned by _ad_pack_checkpoint.
+
+        Returns:
+            :obj:`object`: A checkpoint that can be restored with _ad_restore_at_checkpoint.
+
+        """
+        raise NotImplementedError
+
     def adj_update_value(self, value):
         """This method must be overridden.
 
@@ -0,0 +1,110 @@
+from multiprocessing.pool import ThreadPool
+
+from .block_output import _adj_contributions
+from .tape import stop_annotating
+
+
+def reverse_levels(tape, indices):
+    """Groups the blocks of a reverse sweep into levels of independent blocks.
+
+    A block is put in a later level than every block that uses one of its outputs,
+    since those blocks compute the adjoint values the block needs.
+    Two blocks of the same level never refer to different block outputs of the same object,
+    as restoring one checkpoint of an object may change it in place.
+
+    Args:
+        tape (Tape): The tape.
+        indices (list[int]): The indices of the blocks to evaluate.
+
+    Returns:
+        list[list[int]]: The block indices of each level, in decreasing order.
+            The levels must be evaluated in the order they are returned.
+
+    """
+    blocks = tape.get_blocks()
+    level_of = {}
+    # For each level, maps the id of an object to the block output of it the level refers to.
+    owners = []
+    for i in sorted(indices, reverse=True):
+        block = blocks[i]
+        level = 0
+        for output in block.get_outputs():
+            for consumer in tape.get_consumer_indices(output):
+                if consumer in level_of:
+                    level = max(level, level_of[consumer] + 1)
+
+        refers = block.get_dependencies() + block.get_outputs()
+        while True:
+            if level == len(owners):
+                owners.append({})
+            if all(owners[level].get(id(bo.output), bo) is bo for bo in refers):
+                break
+            level += 1
+
+        for bo in refers:
+            owners[level][id(bo.output)] = bo
+        level_of[i] = level
+
+    levels = [[] for _ in owners]
+    for i in sorted(level_of, reverse=True):
+        levels[level_of[i]].append(i)
+    return levels
+
+
+def evaluate_adj(tape, threads, last_block=0, indices=None):
+    """Runs the reverse sweep of a tape with the independent blocks evaluated in parallel.
+
+    The blocks of each level from :func:`reverse_levels` are evaluated by a pool of threads.
+    The adjoint contributions of a block are collected while it runs, and added to the
+    adjoint values in the same order as a sequential sweep would add them,
+    so the result does not depend on the number of threads.
+
+    Args:
+        tape (Tape): The tape.
+        threads (int): The number of worker threads.
+        last_block (int): The index of the last block to evaluate. Default 0.
+        indices (list[int]|None): If given, only the blocks with these indices are evaluated.
+            Default None.
+
+    """
+    blocks = tape.get_blocks()
+    if indices is None:
+        indices = range(last_block, len(blocks))
+    levels = reverse_levels(tape, [i for i in indices if i >= last_block])
+
+    # Maps block outputs to the contributions (block index, value) that are not yet added.
+    pending = {}
+
+    def flush(bo):
+        contributions = pending.pop(bo, [])
+        # A stable sort keeps the order of contributions within a block.
+        contributions.sort(key=lambda contribution: -contribution[0])
+        for _, value in contributions:
+            bo.add_adj_output(value)
+
+    def run(i):
+        contributions = []
+        _adj_contributions.buffer = contributions
+        try:
+            with stop_annotating():
+                tape._run("adjoint", blocks[i], "evaluate_adj")
+        finally:
+            _adj_contributions.buffer = None
+        return [(i, bo, value) for bo, value in contributions]
+
+    pool = ThreadPool(threads)
+    try:
+        for level in levels:
+            for i in level:
+                for output in blocks[i].get_outputs():
+                    flush(output)
+
+            for contributions in pool.map(run, level):
+                for i, bo, value in contributions:
+                    pending.setdefault(bo, []).append((i, value))
+    finally:
+        pool.close()
+        pool.join()
+
+    for bo in list(pending):
+        flush(bo)
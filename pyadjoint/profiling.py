@@ -0,0 +1,153 @@
+import threading
+from timeit import default_timer
+
+# The stats the operations of each thread are currently counted towards.
+_active = threading.local()
+# Guards the updates of stats, which may be shared by the threads of a parallel sweep.
+_lock = threading.Lock()
+
+
+def _new_stats():
+    return {"calls": 0, "time": 0.0, "assemble": 0, "solve": 0}
+
+
+class TapeProfile(object):
+    """Records timings and operation counts of the sweeps over a tape.
+
+    For each phase (for example "adjoint", "tlm", "hessian" or "replay") the profile records
+    the number of sweeps, the wall time, and the number of assemblies and linear solves.
+    The same quantities are recorded per block class and block method.
+
+    Assemblies and solves are counted where the blocks perform them, see :func:`count`.
+    They are counted towards the profiles active in the calling thread, so sweeps running
+    concurrently in other threads are not counted.
+
+    """
+    def __init__(self):
+        self._phases = {}
+
+    def reset(self):
+        """Removes everything recorded so far."""
+        self._phases = {}
+
+    def phase(self, name):
+        """Returns a context manager that records a sweep of the given phase.
+
+        Args:
+            name (str): The name of the phase.
+
+        """
+        return _Phase(self, name)
+
+    def call(self, phase, block, method):
+        """Calls a method of a block and records it.
+
+        Args:
+            phase (str): The name of the phase.
+            block (:class:`Block`): The block.
+            method (str): The name of the method, for example "evaluate_adj".
+
+        Returns:
+            object: The return value of the method.
+
+        """
+        with _lock:
+            phase_stats = self._get_phase(phase)
+            blocks = phase_stats["blocks"]
+            stats = blocks.setdefault(type(block).__name__, {}).setdefault(method, _new_stats())
+            stats["calls"] += 1
+
+        # A block run by a worker thread of a parallel sweep counts towards the phase as well.
+        stack = _stack()
+        pushed = [stats] if any(s is phase_stats for s in stack) else [phase_stats, stats]
+        stack.extend(pushed)
+        start = default_timer()
+        try:
+            return getattr(block, method)()
+        finally:
+            elapsed = default_timer() - start
+            del stack[-len(pushed):]
+            with _lock:
+                stats["time"] += elapsed
+
+    def report(self):
+        """Returns the recorded data.
+
+        Returns:
+            dict: Maps each phase name to a dict with the keys "calls", "time", "assemble", "solve"
+                and "blocks". The latter maps block class names to a dict from method names
+                to dicts with the keys "calls", "time", "assemble" and "solve".
+
+        """
+        return self._phases
+
+    def __str__(self):
+        lines = []
+        row = "{:<40} {:>8} {:>12} {:>9} {:>7}"
+        for name in sorted(self._phases):
+            phase = self._phases[name]
+            lines.append(row.format(name, phase["calls"], "%.6f" % phase["time"],
+                                    phase["assemble"], phase["solve"]))
+            for cls in sorted(phase["blocks"]):
+                for method, stats in sorted(phase["blocks"][cls].items()):
+                    lines.append(row.format("  {}.{}".format(cls, method), stats["calls"],
+                                            "%.6f" % stats["time"], stats["assemble"], stats["solve"]))
+        header = row.format("", "calls", "time", "assemble", "solve")
+        return "\n".join([header] + lines)
+
+    def _get_phase(self, name):
+        phase = self._phases.get(name)
+        if phase is None:
+            phase = _new_stats()
+            phase["blocks"] = {}
+            self._phases[name] = phase
+        return phase
+
+
+def _stack():
+    stack = getattr(_active, "stack", None)
+    if stack is None:
+        stack = _active.stack = []
+    return stack
+
+
+def count(name):
+    """Counts an operation towards the profiles of the sweeps running in the calling thread.
+
+    Blocks call this next to the backend operations they perform, for example
+    ``count("assemble")`` before assembling a form. Outside of a profiled sweep it does nothing.
+
+    Args:
+        name (str): The operation, "assemble" or "solve".
+
+    """
+    stack = getattr(_active, "stack", None)
+    if not stack:
+        return
+    with _lock:
+        for stats in stack:
+            stats[name] += 1
+
+
+class _Phase(object):
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        with _lock:
+            self.stats = self.profile._get_phase(self.name)
+            self.stats["calls"] += 1
+        # A nested sweep of the same phase must not count the operations twice.
+        stack = _stack()
+        self.pushed = not any(s is self.stats for s in stack)
+        if self.pushed:
+            stack.append(self.stats)
+        self.start = default_timer()
+
+    def __exit__(self, *args):
+        elapsed = default_timer() - self.start
+        if self.pushed:
+            _stack().pop()
+        with _lock:
+            self.stats["time"] += elapsed
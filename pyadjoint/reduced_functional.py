@@ -1,8 +1,28 @@
+import numpy
+
 from .tape import get_working_tape, stop_annotating
 from .drivers import compute_gradient
 from .overloaded_type import OverloadedType
 
 
+def _pack_saved_output(block_output):
+    # Returns the checkpoint of a block output as an array, or None if it cannot be packed.
+    checkpoint = block_output.checkpoint
+    if checkpoint is None:
+        return None
+    try:
+        return numpy.array(block_output.output._ad_pack_checkpoint(checkpoint), copy=True)
+    except NotImplementedError:
+        return None
+
+
+def _unchanged(old, block_output):
+    if old is None:
+        return False
+    new = _pack_saved_output(block_output)
+    return new is not None and numpy.array_equal(old, new)
+
+
 class ReducedFunctional(object):
     """Class representing the reduced functional.
 
@@ -17,22 +37,34 @@ class ReducedFunctional(object):
         controls (OverloadedType): An instance of an OverloadedType,
             which you want to map to the functional. You may also supply a list
             of such instances if you have multiple controls.
+        prune (bool): If True, the derivative only evaluates the blocks that lie on
+            a path from the controls to the functional. Default False.
+        incremental (bool): If True, a call only recomputes the blocks that depend on
+            controls whose value changed. Default False.
+        compare_outputs (bool): If True, an incremental call also stops the replay at
+            blocks whose recomputed outputs did not change. Default False.
+        threads (int|None): If given, the derivative evaluates independent blocks in parallel
+            by this many threads. Default None.
 
     """
-    def __init__(self, functional, controls):
+    def __init__(self, functional, controls, prune=False, incremental=False, compare_outputs=False,
+                 threads=None):
         self.functional = functional
         self.tape = get_working_tape()
+        self.prune = prune
+        self.incremental = incremental
+        self.compare_outputs = compare_outputs
+        self.threads = threads
 
         if isinstance(controls, OverloadedType):
             self.controls = [controls]
         else:
             self.controls = controls
 
-        for i, block in enumerate(self.tape.get_blocks()):
-            for control in self.controls:
-                if control.original_block_output in block.get_dependencies():
-                    self.block_idx = i
-                    return
+        consumers = [self.tape.get_consumer_indices(control.original_block_output) for control in self.controls]
+        first_consumers = [indices[0] for indices in consumers if indices]
+        if first_consumers:
+            self.block_idx = min(first_consumers)
 
     def derivative(self, options={}):
         """Returns the derivative of the functional w.r.t. the control.
@@ -50,7 +82,8 @@ class ReducedFunctional(object):
                 Should be an instance of the same type as the control.
 
         """
-        derivatives = compute_gradient(self.functional, self.controls, options=options, tape=self.tape)
+        derivatives = compute_gradient(self.functional, self.controls, options=options, tape=self.tape,
+                                       prune=self.prune, threads=self.threads)
         if len(derivatives) == 1:
             return derivatives[0]
         else:
@@ -69,17 +102,48 @@ class ReducedFunctional(object):
 
         """
         if isinstance(values, OverloadedType):
-            self.controls[0].adj_update_value(values)
+            values = [values]
+
+        # Checkpoints dropped by checkpointing can only be recovered by a full replay.
+        incremental = self.incremental and not self.tape.is_checkpointing()
+
+        changed = set()
+        for control, value in zip(self.controls, values):
+            old = _pack_saved_output(control.original_block_output) if incremental else None
+            control.adj_update_value(value)
+            if not _unchanged(old, control.original_block_output):
+                changed.add(control.original_block_output)
+
+        if incremental:
+            with self.tape._phase("replay"):
+                with stop_annotating():
+                    self._replay_changed(changed)
         else:
-            for i, value in enumerate(values):
-                self.controls[i].adj_update_value(value)
+            self.tape.recompute(self.tape.get_replay_start(self.block_idx))
+
+        func_value = self.functional.block_output.get_saved_output()
+        self.tape.drop_checkpoints()
+        return func_value
 
+    def _replay_changed(self, changed):
+        # Recomputes the blocks that depend on the changed block outputs,
+        # marking their outputs as changed in turn.
         blocks = self.tape.get_blocks()
-        with stop_annotating():
-            for i in range(self.block_idx, len(blocks)):
-                blocks[i].recompute()
+        pending = set()
+        for block_output in changed:
+            pending.update(self.tape.get_consumer_indices(block_output))
+
+        while pending:
+            i = min(pending)
+            pending.remove(i)
+            outputs = blocks[i].get_outputs()
+            old = [_pack_saved_output(output) for output in outputs] if self.compare_outputs else None
+
+            self.tape._run("replay", blocks[i], "recompute")
 
-        return self.functional.block_output.get_saved_output()
+            for j, output in enumerate(outputs):
+                if old is None or not _unchanged(old[j], output):
+                    pending.update(self.tape.get_consumer_indices(output))
 
 
 
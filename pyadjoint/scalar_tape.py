@@ -0,0 +1,303 @@
+import threading
+import weakref
+
+import numpy
+
+from .block import Block
+from .overloaded_type import OverloadedType
+from .tape import get_working_tape
+
+# Operation codes. INPUT nodes hold a value that is not computed on the scalar tape.
+INPUT, ADD, SUB, MUL, POW = range(5)
+
+# Maps the AdjFloat operators to an operation code, and whether the operands are swapped.
+_OPERATORS = {
+    "__add__": (ADD, False),
+    "__radd__": (ADD, True),
+    "__sub__": (SUB, False),
+    "__rsub__": (SUB, True),
+    "__mul__": (MUL, False),
+    "__rmul__": (MUL, True),
+    "__pow__": (POW, False),
+}
+
+# Levels with fewer operations than this are evaluated in a Python loop,
+# where the overhead of a NumPy call per level does not pay off.
+_MIN_LEVEL_WIDTH = 64
+
+_active = threading.local()
+
+
+def get_scalar_tape():
+    """Returns the :class:`ScalarTape` recording in the current thread, or None."""
+    return getattr(_active, "tape", None)
+
+
+class ScalarTape(object):
+    """Records AdjFloat arithmetic in NumPy arrays instead of one block per operation.
+
+    Within the context, the operations on AdjFloat instances are stored as operation codes
+    and operand indices. When the context exits, the recorded operations are put on the
+    working tape as a single :class:`ScalarTapeBlock`, whose outputs are the results that
+    are still referenced. The adjoint, tangent linear and replay of the block are computed
+    with vectorized NumPy operations over independent operations.
+
+    Only AdjFloat arithmetic should be done within the context, as the block is put on the
+    tape when the context exits.
+
+    Example:
+        >>> with ScalarTape():
+        ...     J = 0
+        ...     for j in timestep_contributions:
+        ...         J = J + j*j
+
+    Args:
+        capacity (int): The initial number of operations to allocate room for. Default 1024.
+
+    """
+    def __init__(self, capacity=1024):
+        self._size = 0
+        self._opcodes = numpy.empty(capacity, dtype=numpy.int8)
+        self._operands = numpy.empty((capacity, 2), dtype=numpy.intp)
+        self._values = numpy.empty(capacity)
+        self._levels = numpy.empty(capacity, dtype=numpy.intp)
+        # Pairs of (node, block output) for the values that come from the tape.
+        self._inputs = []
+        self._input_nodes = {}
+        # Pairs of (node, weak reference to the AdjFloat) for the results.
+        self._results = []
+        self.block = None
+
+    def __enter__(self):
+        self._previous = get_scalar_tape()
+        _active.tape = self
+        return self
+
+    def __exit__(self, *args):
+        _active.tape = self._previous
+        if self._size > 0:
+            self._finish()
+
+    def record(self, name, obj, args, output):
+        """Records an operation.
+
+        Args:
+            name (str): The name of the float operator, for example "__mul__".
+            obj (AdjFloat): The object the operator was called on.
+            args (tuple): The other operands.
+            output (AdjFloat): The result.
+
+        """
+        opcode, swap = _OPERATORS[name]
+        operands = [obj] + list(args)
+        if swap:
+            operands.reverse()
+        lhs = self._node(operands[0])
+        rhs = self._node(operands[1])
+
+        n = self._add_node(opcode, float(output), lhs, rhs)
+        self._levels[n] = max(self._levels[lhs], self._levels[rhs]) + 1
+        output._ad_scalar_node = (self, n)
+        self._results.append((n, weakref.ref(output)))
+
+    def _node(self, value):
+        node = getattr(value, "_ad_scalar_node", None)
+        if node is not None and node[0] is self:
+            return node[1]
+
+        if isinstance(value, OverloadedType):
+            block_output = value.get_block_output()
+            n = self._input_nodes.get(block_output)
+            if n is None:
+                n = self._add_node(INPUT, float(value))
+                self._input_nodes[block_output] = n
+                self._inputs.append((n, block_output))
+            return n
+
+        # Constants are inputs that are not on the tape.
+        return self._add_node(INPUT, float(value))
+
+    def _add_node(self, opcode, value, lhs=0, rhs=0):
+        n = self._size
+        if n == len(self._opcodes):
+            self._grow()
+        self._opcodes[n] = opcode
+        self._operands[n] = (lhs, rhs)
+        self._values[n] = value
+        self._levels[n] = 0
+        self._size += 1
+        return n
+
+    def _grow(self):
+        capacity = 2*max(len(self._opcodes), 1)
+        for name in ("_opcodes", "_operands", "_values", "_levels"):
+            old = getattr(self, name)
+            new = numpy.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _finish(self):
+        n = self._size
+        outputs = []
+        for node, ref in self._results:
+            result = ref()
+            if result is not None:
+                del result._ad_scalar_node
+                outputs.append((node, result))
+
+        tape = get_working_tape()
+        for _, result in outputs:
+            if tape.get_consumer_indices(result.get_block_output()):
+                raise RuntimeError("A result of the scalar tape was used by another block "
+                                   "before the scalar tape was finished.")
+
+        self.block = ScalarTapeBlock(self._opcodes[:n].copy(), self._operands[:n].copy(),
+                                     self._values[:n].copy(), self._levels[:n].copy(),
+                                     self._inputs, [node for node, _ in outputs])
+        tape.add_block(self.block)
+        for _, result in outputs:
+            self.block.add_output(result.get_block_output())
+
+        self._results = []
+        self._inputs = []
+        self._input_nodes = {}
+
+
+class ScalarTapeBlock(Block):
+    """A block that holds the operations recorded by a :class:`ScalarTape`.
+
+    Args:
+        opcodes (numpy.ndarray): The operation code of each node.
+        operands (numpy.ndarray): The two operand nodes of each node.
+        values (numpy.ndarray): The value of each node.
+        levels (numpy.ndarray): The level of each node. Nodes only depend on nodes of lower levels.
+        inputs (list[tuple]): Pairs of (node, block output) for the dependencies.
+        output_nodes (list[int]): The nodes of the outputs, in the order they are added.
+
+    """
+    def __init__(self, opcodes, operands, values, levels, inputs, output_nodes):
+        super(ScalarTapeBlock, self).__init__()
+        self.opcodes = opcodes
+        self.lhs = operands[:, 0]
+        self.rhs = operands[:, 1]
+        self.values = values
+        self.input_nodes = [node for node, _ in inputs]
+        self.output_nodes = output_nodes
+        for _, block_output in inputs:
+            self.add_dependency(block_output)
+
+        # Nodes grouped by level, the input nodes (level 0) are left out.
+        order = numpy.argsort(levels, kind="mergesort")
+        bounds = numpy.searchsorted(levels[order], numpy.arange(1, levels.max() + 2))
+        self.level_nodes = [order[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1)]
+        self._partials = None
+
+    def __str__(self):
+        return "ScalarTapeBlock({} operations)".format(len(self.opcodes) - len(self.input_nodes))
+
+    def get_adj_reads(self):
+        # The values of the nodes are kept on the block.
+        return []
+
+    def _vectorize(self):
+        return len(self.level_nodes)*_MIN_LEVEL_WIDTH <= len(self.opcodes)
+
+    def _evaluate(self, opcodes, x, y):
+        with numpy.errstate(all="ignore"):
+            return numpy.select([opcodes == ADD, opcodes == SUB, opcodes == MUL, opcodes == POW],
+                                [x + y, x - y, x*y, x**y], 0.)
+
+    def _get_partials(self):
+        if self._partials is None:
+            x = self.values[self.lhs]
+            y = self.values[self.rhs]
+            ops = self.opcodes
+            with numpy.errstate(all="ignore"):
+                dx = numpy.select([ops == ADD, ops == SUB, ops == MUL, ops == POW],
+                                  [1., 1., y, y*x**(y - 1)], 0.)
+                dy = numpy.select([ops == ADD, ops == SUB, ops == MUL, ops == POW],
+                                  [1., -1., x, x**y*numpy.log(x)], 0.)
+            # The partials with respect to constants are never used, and may be NaN,
+            # as for the exponent of a negative base.
+            constant = ops == INPUT
+            constant[self.input_nodes] = False
+            dx[constant[self.lhs]] = 0.
+            dy[constant[self.rhs]] = 0.
+            self._partials = (dx, dy)
+        return self._partials
+
+    def evaluate_adj(self):
+        adj = numpy.zeros(len(self.opcodes))
+        found = False
+        for node, output in zip(self.output_nodes, self.get_outputs()):
+            if output.adj_value is not None:
+                adj[node] += float(output.adj_value)
+                found = True
+        if not found:
+            return
+
+        dx, dy = self._get_partials()
+        if self._vectorize():
+            for nodes in reversed(self.level_nodes):
+                adj_nodes = adj[nodes]
+                # A zero adjoint contributes nothing, even if a partial is NaN.
+                with numpy.errstate(invalid="ignore"):
+                    numpy.add.at(adj, self.lhs[nodes], numpy.where(adj_nodes != 0, adj_nodes*dx[nodes], 0.))
+                    numpy.add.at(adj, self.rhs[nodes], numpy.where(adj_nodes != 0, adj_nodes*dy[nodes], 0.))
+        else:
+            adj_list = adj.tolist()
+            lhs, rhs, dx, dy = self.lhs.tolist(), self.rhs.tolist(), dx.tolist(), dy.tolist()
+            inputs = self.opcodes == INPUT
+            for n in reversed(numpy.flatnonzero(~inputs).tolist()):
+                a = adj_list[n]
+                if a:
+                    adj_list[lhs[n]] += a*dx[n]
+                    adj_list[rhs[n]] += a*dy[n]
+            adj = adj_list
+
+        for node, dep in zip(self.input_nodes, self.get_dependencies()):
+            dep.add_adj_output(float(adj[node]))
+
+    def evaluate_tlm(self):
+        tlm = numpy.zeros(len(self.opcodes))
+        found = False
+        for node, dep in zip(self.input_nodes, self.get_dependencies()):
+            if dep.tlm_value is not None:
+                tlm[node] = float(dep.tlm_value)
+                found = True
+        if not found:
+            return
+
+        dx, dy = self._get_partials()
+        for nodes in self.level_nodes:
+            tlm_lhs = tlm[self.lhs[nodes]]
+            tlm_rhs = tlm[self.rhs[nodes]]
+            # A zero tangent contributes nothing, even if a partial is NaN.
+            with numpy.errstate(invalid="ignore"):
+                tlm[nodes] = (numpy.where(tlm_lhs != 0, dx[nodes]*tlm_lhs, 0.)
+                              + numpy.where(tlm_rhs != 0, dy[nodes]*tlm_rhs, 0.))
+
+        for node, output in zip(self.output_nodes, self.get_outputs()):
+            output.add_tlm_output(float(tlm[node]))
+
+    def recompute(self):
+        values = self.values
+        for node, dep in zip(self.input_nodes, self.get_dependencies()):
+            values[node] = float(dep.get_saved_output())
+
+        if self._vectorize():
+            for nodes in self.level_nodes:
+                values[nodes] = self._evaluate(self.opcodes[nodes], values[self.lhs[nodes]],
+                                               values[self.rhs[nodes]])
+        else:
+            operators = {ADD: float.__add__, SUB: float.__sub__, MUL: float.__mul__, POW: float.__pow__}
+            value_list = values.tolist()
+            lhs, rhs, opcodes = self.lhs.tolist(), self.rhs.tolist(), self.opcodes.tolist()
+            for n, opcode in enumerate(opcodes):
+                if opcode != INPUT:
+                    value_list[n] = operators[opcode](value_list[lhs[n]], value_list[rhs[n]])
+            values[:] = value_list
+        self._partials = None
+
+        for node, output in zip(self.output_nodes, self.get_outputs()):
+            output.checkpoint = float(values[node])
@@ -1,30 +1,40 @@
+import logging
+import threading
+
 # Type dependencies
 from . import block
+from .checkpoint_storage import CheckpointStorage
 
 # TOOD: Save/checkpoint functions always. Not just on assign.
 
-_working_tape = None
-_stop_annotating = 0
+# The working tape and the annotation pause counter are local to each thread.
+# Threads that never set a working tape use the one set by the main thread.
+_state = threading.local()
+_default_tape = None
 
 
 def get_working_tape():
-    return _working_tape
+    return getattr(_state, "tape", _default_tape)
 
 
 def set_working_tape(tape):
-    global _working_tape
-    _working_tape = tape
+    global _default_tape
+    if isinstance(threading.current_thread(), threading._MainThread):
+        _default_tape = tape
+    _state.tape = tape
+
+
+def _paused():
+    return getattr(_state, "paused", 0)
 
 
 def pause_annotation():
-    global _stop_annotating
-    _stop_annotating += 1
+    _state.paused = _paused() + 1
 
 
 def continue_annotation():
-    global _stop_annotating
-    _stop_annotating -= 1
-    return _stop_annotating <= 0
+    _state.paused = _paused() - 1
+    return _state.paused <= 0
 
 
 class stop_annotating(object):
@@ -60,12 +70,36 @@ def annotate_tape(kwargs=None):
 
     # TODO: Consider if there is any scenario where one would want the keyword to have
     # precedence over the global flag.
-    if _stop_annotating > 0:
+    if _paused() > 0:
         return False
 
     return annotate
 
 
+class _Recording(object):
+    def __init__(self, tape):
+        self.tape = tape
+
+    def __enter__(self):
+        self.previous = get_working_tape()
+        set_working_tape(self.tape)
+        return self.tape
+
+    def __exit__(self, *args):
+        set_working_tape(self.previous)
+
+
+class _NoPhase(object):
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *args):
+        pass
+
+
+_no_phase = _NoPhase()
+
+
 class Tape(object):
     """The tape.
 
@@ -73,24 +107,182 @@ class Tape(object):
     Each block represents one operation in the forward model.
 
     """
-    __slots__ = ["_blocks"]
+    __slots__ = ["_blocks", "_checkpointing", "_checkpoint_storage",
+                 "_producers", "_consumers", "_indexed", "_paths", "_profile",
+                 "_memory_budget", "_adj_values", "_hessian"]
 
     def __init__(self):
         # Initialize the list of blocks on the tape.
         self._blocks = []
+        self._checkpointing = None
+        self._checkpoint_storage = CheckpointStorage()
+        self._profile = None
+        self._memory_budget = None
+        self._adj_values = None
+        self._hessian = False
+        self._reset_index()
 
     def clear_tape(self):
         self.reset_variables()
         self._blocks = []
+        self._reset_index()
+        if self._checkpointing is not None:
+            self._checkpointing.reset()
+
+    def recording(self):
+        """Returns a context manager that makes this tape the working tape of the current thread.
+
+        The previous working tape is restored when the context exits.
+
+        Example:
+            >>> with Tape().recording() as tape:
+            ...     J = run_model()
+
+        """
+        return _Recording(self)
 
     def add_block(self, block):
         """
         Adds a block to the tape and returns the index.
         """
+        # Outputs are added to a block after it is put on the tape,
+        # so the outputs of the previous blocks are complete by now.
+        self._index_outputs(len(self._blocks))
+
         self._blocks.append(block)
+        idx = len(self._blocks)-1
+        for dep in block.get_dependencies():
+            self._consumers.setdefault(dep, []).append(idx)
+
+        return idx
+
+    def _reset_index(self):
+        # Maps each BlockOutput to the index of the block that produced it,
+        # and to the (sorted) indices of the blocks that depend on it.
+        self._producers = {}
+        self._consumers = {}
+        # The outputs of blocks before this index are indexed.
+        self._indexed = 0
+        # Cache of get_path_indices.
+        self._paths = {}
+
+    def _rebuild_index(self):
+        self._reset_index()
+        for i, block in enumerate(self._blocks):
+            for dep in block.get_dependencies():
+                self._consumers.setdefault(dep, []).append(i)
+        self._index_outputs(len(self._blocks))
+
+    def _index_outputs(self, end):
+        for i in range(self._indexed, end):
+            for output in self._blocks[i].get_outputs():
+                self._producers[output] = i
+        self._indexed = end
+
+    def _update_index(self):
+        # The last block might still get outputs, so it is indexed again next time.
+        self._index_outputs(len(self._blocks))
+        self._indexed = max(len(self._blocks)-1, 0)
+
+    def get_producer_index(self, block_output):
+        """Returns the index of the block that produced a block output.
+
+        Args:
+            block_output (:class:`BlockOutput`): The block output to look up.
+
+        Returns:
+            int|None: The index of the block on the tape, or None if the block output is not
+                the output of a block on the tape (for example a user created control).
+
+        """
+        self._update_index()
+        return self._producers.get(block_output)
+
+    def get_consumer_indices(self, block_output):
+        """Returns the indices of the blocks that depend on a block output.
+
+        Args:
+            block_output (:class:`BlockOutput`): The block output to look up.
+
+        Returns:
+            list[int]: The indices of the blocks on the tape, in increasing order.
+
+        """
+        return self._consumers.get(block_output, [])
 
-        # len() is computed in constant time, so this should be fine.
-        return len(self._blocks)-1
+    def get_path_indices(self, sources, sink):
+        """Returns the indices of the blocks that lie on a path from the sources to the sink.
+
+        These are the only blocks that contribute to the derivative of the sink
+        with respect to the sources. The result is cached until the tape changes.
+
+        Args:
+            sources (list[:class:`BlockOutput`]): The block outputs to start from, usually the controls.
+            sink (:class:`BlockOutput`): The block output to end in, usually the functional.
+
+        Returns:
+            list[int]: The indices of the blocks on the tape, in increasing order.
+
+        """
+        self._update_index()
+        key = (tuple(sources), sink, len(self._blocks))
+        if key in self._paths:
+            return self._paths[key]
+
+        # Blocks that depend on the sources.
+        forward = set()
+        stack = list(sources)
+        while stack:
+            for i in self.get_consumer_indices(stack.pop()):
+                if i not in forward:
+                    forward.add(i)
+                    stack.extend(self._blocks[i].get_outputs())
+
+        # Blocks the sink depends on.
+        backward = set()
+        stack = [sink]
+        while stack:
+            i = self._producers.get(stack.pop())
+            if i is not None and i not in backward:
+                backward.add(i)
+                stack.extend(self._blocks[i].get_dependencies())
+
+        indices = sorted(forward & backward)
+        self._paths[key] = indices
+        return indices
+
+    def mark_active(self, sources):
+        """Marks the dependencies of the blocks that depend on the sources as active, and the others as inactive.
+
+        The derivatives with respect to the sources do not flow through inactive block outputs,
+        so blocks skip the derivatives with respect to inactive dependencies in the reverse sweep.
+        Block outputs that depend on the sources but not lead to the functional get no adjoint
+        value, which blocks already check for. Every block output is active again after
+        :meth:`reset_activity`.
+
+        Args:
+            sources (list[:class:`BlockOutput`]): The block outputs to start from, usually the controls.
+
+        """
+        self._update_index()
+        active = set(sources)
+        stack = list(sources)
+        while stack:
+            for i in self.get_consumer_indices(stack.pop()):
+                for output in self._blocks[i].get_outputs():
+                    if output not in active:
+                        active.add(output)
+                        stack.append(output)
+
+        for block in self._blocks:
+            for dep in block.get_dependencies():
+                dep.active = dep in active
+
+    def reset_activity(self):
+        """Marks every block output as active, see :meth:`mark_active`."""
+        for block in self._blocks:
+            for dep in block.get_dependencies():
+                dep.active = True
 
     def get_blocks(self):
         """Returns a list of the blocks on the tape.
@@ -101,17 +293,388 @@ class Tape(object):
         """
         return self._blocks
 
-    def evaluate(self, last_block=0):
-        for i in range(len(self._blocks)-1, last_block-1, -1):
-            self._blocks[i].evaluate_adj()
+    def optimize(self, functionals):
+        """Removes the blocks that do not contribute to the functionals.
+
+        A block is removed if it has no dependencies, or if none of its outputs are
+        used by another block or as a functional. The checkpoints of the outputs of
+        removed blocks are released, unless another block still depends on them.
+
+        This should be called after the forward model has been annotated, and before
+        creating a :class:`ReducedFunctional` or :class:`Hessian` of this tape,
+        as it changes the indices of the blocks.
+
+        Args:
+            functionals (list[OverloadedType]): The functionals that will be differentiated.
+
+        Returns:
+            int: The number of removed blocks.
+
+        """
+        self._update_index()
+        live = set(f.block_output for f in functionals)
+        keep = []
+        released = []
+        with stop_annotating():
+            for block in reversed(self._blocks):
+                outputs = block.get_outputs()
+                used = [output for output in outputs if output in live]
+                if used and block.get_dependencies():
+                    keep.append(block)
+                    live.update(block.get_dependencies())
+                    continue
+
+                if used and any(output.checkpoint is None for output in used):
+                    # The outputs are kept as leaves, so their checkpoints must be available.
+                    block.recompute()
+                released.extend(output for output in outputs if output not in live)
+
+        for output in released:
+            output.drop_checkpoint()
+
+        removed = len(self._blocks) - len(keep)
+        keep.reverse()
+        self._blocks = keep
+        self._rebuild_index()
+        if self._checkpointing is not None:
+            self._checkpointing.reset()
+            self.drop_checkpoints()
+        return removed
+
+    def set_checkpoint_storage(self, storage):
+        """Sets the storage backend for new checkpoints of objects on this tape.
+
+        Checkpoints that have already been saved are kept where they are.
+
+        Args:
+            storage (:class:`pyadjoint.checkpoint_storage.CheckpointStorage`): The storage backend,
+                for example :class:`pyadjoint.checkpoint_storage.DiskCheckpointStorage`.
+
+        """
+        self._checkpoint_storage = storage
+
+    def get_checkpoint_storage(self):
+        """Returns the storage backend for checkpoints of objects on this tape.
+
+        Returns:
+            :class:`pyadjoint.checkpoint_storage.CheckpointStorage`: The storage backend.
+
+        """
+        return self._checkpoint_storage
+
+    def enable_checkpointing(self, snapshots):
+        """Only keeps `snapshots` snapshots of the block outputs on the tape.
+
+        The remaining checkpoints are dropped, and recomputed from the closest snapshot
+        during the reverse sweep using an optimal binomial schedule.
+        See :class:`pyadjoint.checkpointing.BinomialCheckpointing`.
+
+        This should be called after the forward model has been annotated.
+        Note that the recomputations overwrite the values of the forward model objects,
+        in the same way as a replay of a :class:`ReducedFunctional` does.
+
+        Args:
+            snapshots (int): The number of snapshots to keep.
+
+        """
+        from .checkpointing import BinomialCheckpointing
+        self._checkpointing = BinomialCheckpointing(snapshots)
+        self.drop_checkpoints()
+
+    def enable_adjoint_checkpointing(self, controls):
+        """Only keeps the checkpoints that the reverse sweep with respect to the controls reads.
+
+        The remaining checkpoints of block outputs produced by blocks on the tape are dropped.
+        See :class:`pyadjoint.checkpointing.AdjointCheckpointing`.
+
+        This should be called after the forward model has been annotated.
+        Note that sweeps which need dropped checkpoints recompute them, which overwrites the
+        values of the forward model objects in the same way as a replay of a
+        :class:`ReducedFunctional` does.
+
+        Args:
+            controls (OverloadedType|list[OverloadedType]): The control, or a list of controls.
+
+        """
+        from .checkpointing import AdjointCheckpointing
+        controls = controls if isinstance(controls, (list, tuple)) else [controls]
+        self._checkpointing = AdjointCheckpointing([c.original_block_output for c in controls])
+        self.drop_checkpoints()
+
+    def is_checkpointing(self):
+        """Returns True if checkpointing is enabled, see :meth:`enable_checkpointing`
+        and :meth:`enable_adjoint_checkpointing`."""
+        return self._checkpointing is not None
+
+    def drop_checkpoints(self):
+        """Drops the checkpoints that are not kept by the checkpointing schedule.
+
+        Does nothing if checkpointing is not enabled.
+
+        """
+        if self._checkpointing is not None:
+            self._checkpointing.drop_checkpoints(self)
+
+    def get_replay_start(self, block_idx):
+        """Returns the index of the block a forward replay must start from.
+
+        A replay that should recompute every block from `block_idx` and onwards must
+        start at an earlier block if some of the checkpoints it needs have been dropped.
+
+        Args:
+            block_idx (int): The index of the first block that must be recomputed.
+
+        Returns:
+            int: The index of the first block to recompute.
+
+        """
+        if self._checkpointing is not None:
+            return self._checkpointing.replay_start(self, block_idx)
+        return block_idx
+
+    def enable_profiling(self):
+        """Starts recording timings and operation counts of the sweeps over this tape.
+
+        The blocks count their assemblies and solves with :func:`pyadjoint.profiling.count`.
+
+        Returns:
+            :class:`pyadjoint.profiling.TapeProfile`: The profile the data is recorded to.
+
+        """
+        from .profiling import TapeProfile
+        if self._profile is None:
+            self._profile = TapeProfile()
+        return self._profile
+
+    def disable_profiling(self):
+        """Stops recording timings. The recorded profile is discarded."""
+        self._profile = None
+
+    def get_profile(self):
+        """Returns the :class:`pyadjoint.profiling.TapeProfile` of this tape, or None if not profiling."""
+        return self._profile
+
+    def memory_report(self, block_range=100):
+        """Returns an estimate of the memory held by the block outputs and blocks on this tape.
+
+        Args:
+            block_range (int): The number of consecutive blocks to group in the report. Default 100.
+
+        Returns:
+            :class:`pyadjoint.memory.MemoryReport`: The report.
+
+        """
+        from .memory import MemoryReport
+        report = MemoryReport(self, block_range=block_range)
+        if self._memory_budget is not None and report.total > self._memory_budget:
+            logging.warning("The tape holds an estimated %d bytes, which exceeds the budget of %d bytes.\n%s",
+                            report.total, self._memory_budget, report)
+        return report
+
+    def set_memory_budget(self, budget):
+        """Sets a memory budget for the tape.
+
+        After each sweep over the tape the memory is estimated with :meth:`memory_report`,
+        and a warning is logged if it exceeds the budget.
+
+        Args:
+            budget (int|None): The budget in bytes. None (default) disables the check.
+
+        """
+        self._memory_budget = budget
+
+    def _check_memory_budget(self):
+        if self._memory_budget is not None:
+            self.memory_report()
+
+    def _phase(self, name):
+        if self._profile is None:
+            return _no_phase
+        return self._profile.phase(name)
+
+    def _run(self, phase, block, method):
+        if self._profile is None:
+            return getattr(block, method)()
+        return self._profile.call(phase, block, method)
+
+    def evaluate(self, last_block=0, indices=None, threads=None, hessian=False):
+        """Runs the reverse sweep.
+
+        Args:
+            last_block (int): The index of the last block to evaluate. Default 0.
+            indices (list[int]|None): If given, only the blocks with these indices are evaluated,
+                see :meth:`get_path_indices`. Default None.
+            threads (int|None): If given, independent blocks are evaluated in parallel by this many
+                threads, see :func:`pyadjoint.parallel.evaluate_adj`. Ignored if checkpointing
+                is enabled. Default None.
+            hessian (bool): If True, the blocks keep what a following :meth:`evaluate_hessian`
+                can reuse, see :meth:`prepares_hessian`. Default False.
+
+        """
+        self._hessian = hessian
+        try:
+            with self._phase("adjoint"):
+                if self._checkpointing is not None:
+                    self._checkpointing.evaluate_adj(self, last_block, indices)
+                elif threads is not None:
+                    from .parallel import evaluate_adj
+                    evaluate_adj(self, threads, last_block, indices)
+                else:
+                    if indices is None:
+                        indices = range(last_block, len(self._blocks))
+                    for i in reversed(indices):
+                        if i >= last_block:
+                            self._evaluate_adj(self._blocks[i])
+        finally:
+            self._hessian = False
+        self._check_memory_budget()
+
+    def prepares_hessian(self):
+        """Returns True during a reverse sweep that is followed by a Hessian evaluation.
+
+        Blocks may then keep data that their :meth:`Block.evaluate_hessian` reuses,
+        such as the solution of an adjoint equation, see :meth:`evaluate`.
+
+        """
+        return self._hessian
+
+    def evaluate_batch(self, adj_inputs, last_block=0, indices=None):
+        """Runs the reverse sweep for several adjoint inputs, such as the seeds of several functionals.
+
+        Each block is evaluated for every adjoint input before the next block, so that
+        the work of a block that does not depend on the adjoint input, such as assembling
+        and factorizing an operator, is done once for all of them. The arguments
+        `last_block` and `indices` are as for :meth:`evaluate`.
+
+        Args:
+            adj_inputs (list[dict]): For each adjoint input, the initial adjoint values keyed by block output.
+
+        Returns:
+            list[dict]: For each adjoint input, the adjoint values of the block outputs, keyed by block output.
+
+        """
+        self._adj_values = [dict(inputs) for inputs in adj_inputs]
+        try:
+            self.evaluate(last_block, indices)
+            return self._adj_values
+        finally:
+            self._adj_values = None
+
+    def _evaluate_adj(self, block):
+        if self._adj_values is None:
+            return self._run("adjoint", block, "evaluate_adj")
+
+        block_outputs = block.get_dependencies() + block.get_outputs()
+        for values in self._adj_values:
+            for block_output in block_outputs:
+                block_output.adj_value = values.get(block_output)
+            self._run("adjoint", block, "evaluate_adj")
+            for block_output in block.get_dependencies():
+                if block_output.adj_value is not None:
+                    values[block_output] = block_output.adj_value
+        for block_output in block_outputs:
+            block_output.adj_value = None
 
     def evaluate_tlm(self):
-        for i in range(len(self._blocks)):
-            self._blocks[i].evaluate_tlm()
+        with self._phase("tlm"):
+            # The second order sweeps need all checkpoints,
+            # these are dropped again at the end of evaluate_hessian.
+            if self._checkpointing is not None:
+                self._checkpointing.restore(self)
+
+            for i in range(len(self._blocks)):
+                self._run("tlm", self._blocks[i], "evaluate_tlm")
+        self._check_memory_budget()
 
     def evaluate_hessian(self):
-        for i in range(len(self._blocks)-1, -1, -1):
-            self._blocks[i].evaluate_hessian()
+        with self._phase("hessian"):
+            for i in range(len(self._blocks)-1, -1, -1):
+                self._run("hessian", self._blocks[i], "evaluate_hessian")
+        self._check_memory_budget()
+
+        self.drop_checkpoints()
+
+    def evaluate_tlm_batch(self, tlm_inputs):
+        """Runs the tangent linear sweep for several directions.
+
+        Each block is evaluated in every direction before the next block, so that
+        the work of a block that does not depend on the direction, such as assembling
+        and factorizing an operator, is done once for all directions.
+
+        Args:
+            tlm_inputs (list[dict]): For each direction, the initial tlm values keyed by block output.
+
+        Returns:
+            list[dict]: For each direction, the tlm values of the block outputs, keyed by block output.
+
+        """
+        tlm_values = [dict(inputs) for inputs in tlm_inputs]
+        with self._phase("tlm"):
+            # The checkpoints are dropped again at the end of evaluate_hessian_batch.
+            if self._checkpointing is not None:
+                self._checkpointing.restore(self)
+
+            for block in self._blocks:
+                block_outputs = block.get_dependencies() + block.get_outputs()
+                for values in tlm_values:
+                    for block_output in block_outputs:
+                        block_output.tlm_value = values.get(block_output)
+                    self._run("tlm", block, "evaluate_tlm")
+                    for block_output in block.get_outputs():
+                        if block_output.tlm_value is not None:
+                            values[block_output] = block_output.tlm_value
+                for block_output in block_outputs:
+                    block_output.tlm_value = None
+        self._check_memory_budget()
+        return tlm_values
+
+    def evaluate_hessian_batch(self, tlm_values, hessian_inputs):
+        """Runs the second order adjoint sweep for several directions.
+
+        The adjoint values must be those of a reverse sweep at the same point.
+        As in :meth:`evaluate_tlm_batch`, each block is evaluated in every direction
+        before the next block.
+
+        Args:
+            tlm_values (list[dict]): For each direction, the tlm values returned by :meth:`evaluate_tlm_batch`.
+            hessian_inputs (list[dict]): For each direction, the initial hessian values keyed by block output.
+
+        Returns:
+            list[dict]: For each direction, the hessian values of the block outputs, keyed by block output.
+
+        """
+        hessian_values = [dict(inputs) for inputs in hessian_inputs]
+        with self._phase("hessian"):
+            for block in reversed(self._blocks):
+                block_outputs = block.get_dependencies() + block.get_outputs()
+                for tlm, values in zip(tlm_values, hessian_values):
+                    for block_output in block_outputs:
+                        block_output.tlm_value = tlm.get(block_output)
+                        block_output.hessian_value = values.get(block_output)
+                    self._run("hessian", block, "evaluate_hessian")
+                    for block_output in block.get_dependencies():
+                        if block_output.hessian_value is not None:
+                            values[block_output] = block_output.hessian_value
+                for block_output in block_outputs:
+                    block_output.tlm_value = None
+                    block_output.hessian_value = None
+        self._check_memory_budget()
+
+        self.drop_checkpoints()
+        return hessian_values
+
+    def recompute(self, start=0):
+        """Recomputes the blocks on the tape, in order.
+
+        Args:
+            start (int): The index of the first block to recompute. Default 0.
+
+        """
+        with self._phase("replay"):
+            with stop_annotating():
+                for i in range(start, len(self._blocks)):
+                    self._run("replay", self._blocks[i], "recompute")
+        self._check_memory_budget()
 
     def reset_variables(self):
         for i in range(len(self._blocks)-1, -1, -1):
@@ -0,0 +1,84 @@
+import pytest
+import numpy
+
+# this test only uses AdjArray so it should run under both firedrake and fenics
+try:
+    from fenics_adjoint import *
+except ImportError:
+    from firedrake_adjoint import *
+
+
+def _misfit(x, m):
+    obs = numpy.arange(5.)
+    y = (x*1.3 - obs)**2/2. + x[1:3].sum() - x[[0, 0, 4]].dot(numpy.array([1., 2., 3.]))
+    return m.dot(y).sum() + (1/x).sum() + (2**x).sum(axis=0) + x.norm() + (x*m*m).sum(axis=1)[1]
+
+
+def test_array_misfit():
+    set_working_tape(Tape())
+    x = AdjArray(numpy.linspace(0.5, 2, 5))
+    m = AdjArray(2*numpy.ones((3, 5)))
+    J = _misfit(x, m)
+
+    Jhat = ReducedFunctional(J, x)
+    assert Jhat(x) == J
+    h = AdjArray(numpy.linspace(0.1, 0.3, 5))
+    assert taylor_test(Jhat, x, h) > 1.9
+
+    Jhat = ReducedFunctional(J, m)
+    h = AdjArray(numpy.linspace(0.1, 0.3, 15).reshape(3, 5))
+    assert taylor_test(Jhat, m, h) > 1.9
+
+
+def test_array_tlm():
+    tape = Tape()
+    set_working_tape(tape)
+    x = AdjArray(numpy.linspace(0.5, 2, 5))
+    m = AdjArray(2*numpy.ones((3, 5)))
+    terms = [m.dot(x).sum(), (x*m).sum(axis=1)[1], (1/x).dot(m[2]*x), (x*m[0]).norm()]
+
+    hx = numpy.linspace(0.1, 0.3, 5)
+    hm = numpy.linspace(0.1, 0.3, 15).reshape(3, 5)
+    x.set_initial_tlm_input(hx)
+    m.set_initial_tlm_input(hm)
+    tape.evaluate_tlm()
+
+    for J in terms:
+        dJdx, dJdm = compute_gradient(J, [x, m])
+        J.block_output.adj_value = None
+        expected = numpy.dot(dJdx, hx) + numpy.vdot(dJdm, hm)
+        assert abs(J.block_output.tlm_value - expected) < 1e-12
+
+
+def test_array_ufuncs():
+    from pyadjoint.tape import stop_annotating
+    set_working_tape(Tape())
+    x = AdjArray(numpy.linspace(0.5, 2, 5))
+    J = (numpy.multiply(x, x) + numpy.power(x, 3) - numpy.negative(x) + numpy.divide(1, x)
+         - numpy.subtract(numpy.ones(5), x)).sum()
+
+    x_ = numpy.linspace(0.5, 2, 5)
+    dJdx = compute_gradient(J, x)
+    assert numpy.allclose(dJdx.view(numpy.ndarray), 2*x_ + 3*x_**2 + 2 - 1/x_**2)
+
+    with pytest.raises(TypeError):
+        numpy.exp(x).dot(x)
+    with pytest.raises(TypeError):
+        numpy.sin(x).sum()
+    assert type(x > 1) is numpy.ndarray
+    with stop_annotating():
+        assert type(numpy.exp(x)) is numpy.ndarray
+
+
+def test_array_inplace():
+    set_working_tape(Tape())
+    x = AdjArray(numpy.linspace(0.5, 2, 5))
+    y = x
+    y += 1
+    assert y is not x
+
+    with pytest.raises(TypeError):
+        x[0] = 2.
+    with pytest.raises(TypeError):
+        numpy.multiply(x, 2, out=x)
+    assert numpy.array_equal(x.view(numpy.ndarray), numpy.linspace(0.5, 2, 5))
@@ -0,0 +1,248 @@
+import pytest
+pytest.importorskip("fenics")
+
+from fenics import *
+from fenics_adjoint import *
+
+
+def _float_model(n):
+    a = AdjFloat(1.5)
+    c = AdjFloat(0.5)
+    x = a
+    for i in range(n):
+        x = x*c + a
+    return x, a, c
+
+
+@pytest.mark.parametrize("snapshots", [1, 3, 10])
+def test_binomial_checkpointing_floats(snapshots):
+    set_working_tape(Tape())
+    J, a, c = _float_model(30)
+    dJda, dJdc = compute_gradient(J, [a, c])
+
+    tape = Tape()
+    set_working_tape(tape)
+    J, a, c = _float_model(30)
+    tape.enable_checkpointing(snapshots)
+
+    kept = [o for b in tape.get_blocks() for o in b.get_outputs() if o.checkpoint is not None]
+    assert len(kept) <= snapshots + 1
+
+    g = compute_gradient(J, [a, c])
+    assert abs(g[0] - dJda) < 1e-12
+    assert abs(g[1] - dJdc) < 1e-12
+
+    # Gradients can be evaluated repeatedly, and after a replay.
+    g = compute_gradient(J, [a, c])
+    assert abs(g[0] - dJda) < 1e-12
+
+    Jhat = ReducedFunctional(J, [a, c])
+    assert Jhat([AdjFloat(1.5), AdjFloat(0.5)]) == J
+
+
+def test_dropped_checkpoint():
+    tape = Tape()
+    set_working_tape(tape)
+    J, a, c = _float_model(10)
+    tape.enable_checkpointing(1)
+
+    dropped = [o for b in tape.get_blocks() for o in b.get_outputs() if o.checkpoint is None]
+    assert dropped
+    # The live output is not a substitute for a dropped checkpoint.
+    with pytest.raises(RuntimeError):
+        dropped[0].get_saved_output()
+
+    # A replay recomputes the checkpoint.
+    tape.recompute()
+    assert dropped[0].get_saved_output() == dropped[0].output
+
+    # Blocks added after the checkpoints were dropped change the schedule.
+    tape.drop_checkpoints()
+    K = J*a
+    dKda = compute_gradient(K, a)
+
+    set_working_tape(Tape())
+    J, a, c = _float_model(10)
+    assert abs(compute_gradient(J*a, a) - dKda) < 1e-12
+
+
+def test_binomial_checkpointing_time_dependent():
+    mesh = IntervalMesh(10, 0, 1)
+    V = FunctionSpace(mesh, "CG", 1)
+
+    def model():
+        u = TrialFunction(V)
+        v = TestFunction(V)
+        u_ = Function(V)
+        u_1 = Function(V)
+        f = Constant(1)
+        bc = DirichletBC(V, 1, "on_boundary")
+
+        a = u_1*u*v*dx + 0.1*f*inner(grad(u), grad(v))*dx
+        L = u_1*v*dx
+        u_1.vector()[:] = 1
+        for i in range(10):
+            solve(a == L, u_, bc)
+            u_1.assign(u_)
+        return assemble(u_1**2*dx), f
+
+    set_working_tape(Tape())
+    J, f = model()
+    dJdf = compute_gradient(J, f)
+
+    tape = Tape()
+    set_working_tape(tape)
+    J, f = model()
+    tape.enable_checkpointing(3)
+    assert abs(float(compute_gradient(J, f)) - float(dJdf)) < 1e-12
+
+    Jhat = ReducedFunctional(J, f)
+    assert taylor_test(Jhat, Constant(1), Constant(1)) > 1.9
+
+
+def test_adjoint_checkpointing_heat_equation():
+    mesh = IntervalMesh(10, 0, 1)
+    V = FunctionSpace(mesh, "CG", 1)
+
+    def model():
+        u = TrialFunction(V)
+        v = TestFunction(V)
+        u_ = Function(V)
+        u_1 = Function(V)
+        f = Function(V)
+        f.vector()[:] = 1
+        dt = Constant(0.1)
+        bc = DirichletBC(V, 0, "on_boundary")
+
+        a = u*v*dx + dt*inner(grad(u), grad(v))*dx
+        L = u_1*v*dx + dt*f*v*dx
+        for i in range(10):
+            solve(a == L, u_, bc)
+            u_1.assign(u_)
+        return assemble(u_1*dx), f
+
+    set_working_tape(Tape())
+    J, f = model()
+    dJdf = compute_gradient(J, f)
+
+    tape = Tape()
+    set_working_tape(tape)
+    J, f = model()
+    tape.enable_adjoint_checkpointing(f)
+
+    # The adjoint of the linear solves does not read their solutions.
+    outputs = [o for b in tape.get_blocks() for o in b.get_outputs()]
+    assert all(o.checkpoint is None for o in outputs)
+
+    assert (compute_gradient(J, f).vector() - dJdf.vector()).norm("l2") < 1e-12*dJdf.vector().norm("l2")
+
+    # A reverse sweep with another control recomputes the checkpoints it reads.
+    J.block_output.adj_value = None
+    dt = [c for c in tape.get_blocks()[0].get_dependencies() if isinstance(c.output, Constant)][0].output
+    compute_gradient(J, [f, dt])
+    assert all(o.checkpoint is None for o in outputs)
+
+    Jhat = ReducedFunctional(J, f)
+    assert abs(Jhat(f.copy(deepcopy=True)) - J) < 1e-12
+    assert (Jhat.derivative().vector() - dJdf.vector()).norm("l2") < 1e-12*dJdf.vector().norm("l2")
+
+
+def test_disk_checkpoint_storage():
+    from pyadjoint.checkpoint_storage import DiskCheckpointStorage
+
+    tape = Tape()
+    set_working_tape(tape)
+    storage = DiskCheckpointStorage(min_size=0)
+    tape.set_checkpoint_storage(storage)
+
+    mesh = IntervalMesh(10, 0, 1)
+    V = FunctionSpace(mesh, "CG", 1)
+    f = Function(V)
+    f.vector()[:] = 2
+
+    u = Function(V)
+    v = TestFunction(V)
+    bc = DirichletBC(V, 1, "on_boundary")
+    solve(inner(grad(u), grad(v))*dx + u**2*v*dx - f*v*dx == 0, u, bc)
+    J = assemble(u**2*dx)
+
+    import os
+    assert len(os.listdir(storage.directory)) > 0
+
+    Jhat = ReducedFunctional(J, f)
+    h = Function(V)
+    h.vector()[:] = 1
+    assert taylor_test(Jhat, f.copy(deepcopy=True), h) > 1.9
+
+
+def test_deduplicating_checkpoint_storage():
+    from pyadjoint.checkpoint_storage import DeduplicatingCheckpointStorage
+
+    mesh = IntervalMesh(10, 0, 1)
+    V = FunctionSpace(mesh, "CG", 1)
+
+    def model():
+        u = TrialFunction(V)
+        v = TestFunction(V)
+        u_ = Function(V)
+        f = Function(V)
+        f.vector()[:] = 1
+        g = Function(V)
+        bc = DirichletBC(V, 0, "on_boundary")
+        J = 0
+        for i in range(5):
+            # The same value is checkpointed in every step.
+            g.assign(f)
+            solve(u*v*dx + inner(grad(u), grad(v))*dx == g*v*dx, u_, bc)
+            J += assemble(u_**2*dx)
+        return J, f
+
+    tape = Tape()
+    set_working_tape(tape)
+    J, f = model()
+    size = tape.memory_report().totals["checkpoint"]
+    dJdf = compute_gradient(J, f)
+
+    tape = Tape()
+    set_working_tape(tape)
+    storage = DeduplicatingCheckpointStorage()
+    tape.set_checkpoint_storage(storage)
+    J, f = model()
+    assert storage.hits > 0
+    # The shared buffers are counted once.
+    assert 0 < tape.memory_report().totals["checkpoint"] < size
+    assert (compute_gradient(J, f).vector() - dJdf.vector()).norm("l2") < 1e-12*dJdf.vector().norm("l2")
+
+
+@pytest.mark.parametrize("codec", ["zlib", "float32", "float16"])
+def test_compressed_checkpoint_storage(codec):
+    from pyadjoint.checkpoint_storage import CompressedCheckpointStorage
+
+    mesh = IntervalMesh(200, 0, 1)
+    V = FunctionSpace(mesh, "CG", 1)
+
+    def model():
+        f = Function(V)
+        f.vector()[:] = 2
+
+        u = Function(V)
+        v = TestFunction(V)
+        bc = DirichletBC(V, 1, "on_boundary")
+        solve(inner(grad(u), grad(v))*dx + u**2*v*dx - f*v*dx == 0, u, bc)
+        return assemble(u**2*dx), f
+
+    tape = Tape()
+    set_working_tape(tape)
+    J, f = model()
+    size = tape.memory_report().totals["checkpoint"]
+    dJdf = compute_gradient(J, f)
+
+    tape = Tape()
+    set_working_tape(tape)
+    tape.set_checkpoint_storage(CompressedCheckpointStorage(codecs={Function: codec}))
+    J, f = model()
+    assert 0 < tape.memory_report().totals["checkpoint"] < size
+
+    tol = {"zlib": 1e-12, "float32": 1e-6, "float16": 1e-2}[codec]
+    error = (compute_gradient(J, f).vector() - dJdf.vector()).norm("l2")
+    assert error < tol*dJdf.vector().norm("l2")
@@ -91,3 +91,79 @@ def test_float_exponentiation():
     assert rf(AdjFloat(2.0)) == 4.0
 
     # TODO: __rpow__ is not yet implemented
+
+
+def test_float_constants():
+    from pyadjoint.tape import stop_annotating
+
+    tape = Tape()
+    set_working_tape(tape)
+    a = AdjFloat(3.0)
+    with stop_annotating():
+        b = a*a + 1.0
+    assert b == 10.0
+    assert "block_output" not in b.__dict__
+    assert len(tape.get_blocks()) == 0
+
+    c = 2.0*a - 1.0
+    assert len(tape.get_blocks()) == 2
+    for block in tape.get_blocks():
+        assert len(block.get_dependencies()) == 1
+
+    rf = ReducedFunctional(c, a)
+    assert rf(AdjFloat(4.0)) == 7.0
+    assert rf.derivative() == 2.0
+
+
+@pytest.mark.parametrize("vectorize", [False, True])
+@pytest.mark.parametrize("n", [10, 1000])
+def test_scalar_tape(n, vectorize, monkeypatch):
+    if vectorize:
+        # Evaluates every level with NumPy, however few operations it has.
+        monkeypatch.setattr("pyadjoint.scalar_tape._MIN_LEVEL_WIDTH", 0)
+
+    def model():
+        a = AdjFloat(1.1)
+        b = AdjFloat(0.7)
+        J = 0
+        for i in range(n):
+            J = J + (a*b - i*0.001)*(b - 0.2)*a
+        J = J*2
+        return J, a, b
+
+    set_working_tape(Tape())
+    J, a, b = model()
+    dJ = compute_gradient(J, [a, b])
+    J_new = ReducedFunctional(J, [a, b])([AdjFloat(1.2), AdjFloat(0.6)])
+
+    tape = Tape()
+    set_working_tape(tape)
+    with ScalarTape():
+        J_scalar, a, b = model()
+    assert len(tape.get_blocks()) == 1
+    assert J_scalar == J
+
+    dJ_scalar = compute_gradient(J_scalar, [a, b])
+    for g, g_scalar in zip(dJ, dJ_scalar):
+        assert abs(g - g_scalar) < 1e-10*abs(g)
+
+    Jhat = ReducedFunctional(J_scalar, [a, b])
+    assert abs(Jhat([AdjFloat(1.2), AdjFloat(0.6)]) - J_new) < 1e-10*abs(J_new)
+
+
+@pytest.mark.parametrize("vectorize", [False, True])
+def test_scalar_tape_negative_base(vectorize, monkeypatch):
+    if vectorize:
+        monkeypatch.setattr("pyadjoint.scalar_tape._MIN_LEVEL_WIDTH", 0)
+
+    tape = Tape()
+    set_working_tape(tape)
+    x = AdjFloat(-3.0)
+    y = AdjFloat(2.0)
+    with ScalarTape():
+        # The partial derivatives with respect to the exponents are NaN.
+        J = x**2.0 + x**y
+
+    assert compute_jacobian_action(J, x, [1.0]) == [-12.0]
+    assert compute_jacobian_action(J, [x, y], [[1.0, 0.0]]) == [-12.0]
+    assert compute_gradient(J, x) == -12.0
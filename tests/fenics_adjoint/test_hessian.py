@@ -54,6 +54,75 @@ def test_simple_solve():
     assert(taylor_test(Jhat, m, h, dJdm=dJdm, Hm=Hm) > 2.9)
 
 
+def test_stored_adjoint_solution():
+    from fenics_adjoint.solving import SolveBlock
+
+    tape = Tape()
+    set_working_tape(tape)
+
+    mesh = UnitIntervalMesh(10)
+    V = FunctionSpace(mesh, "Lagrange", 1)
+
+    f = Function(V)
+    f.vector()[:] = 2
+
+    u = Function(V)
+    v = TestFunction(V)
+    bc = DirichletBC(V, 1, "on_boundary")
+    solve(u**2*v*dx + inner(grad(u), grad(v))*dx - f*v*dx == 0, u, bc)
+    J = assemble(u**4*dx)
+
+    h = Function(V)
+    h.vector()[:] = rand(V.dim())
+
+    block = [b for b in tape.get_blocks() if isinstance(b, SolveBlock)][0]
+
+    def hessian_action(stored):
+        # Without the stored solution, the first order adjoint equation is solved again.
+        compute_gradient(J, f, hessian=stored)
+        assert (block.get_stored_data() != []) == stored
+        assert (tape.memory_report().totals["block_data"] > 0) == stored
+
+        Hm = Hessian(J, f)(h)
+        # The stored solution is released once it has been used.
+        assert block.get_stored_data() == []
+        return Hm.vector().inner(h.vector())
+
+    Hm = hessian_action(True)
+    assert abs(hessian_action(False) - Hm) < 1e-10*abs(Hm)
+
+
+def test_hessian_batch():
+    tape = Tape()
+    set_working_tape(tape)
+
+    mesh = UnitIntervalMesh(10)
+    V = FunctionSpace(mesh, "Lagrange", 1)
+
+    f = Function(V)
+    f.vector()[:] = 2
+
+    u = Function(V)
+    v = TestFunction(V)
+    bc = DirichletBC(V, 1, "on_boundary")
+    solve(u**2*v*dx + inner(grad(u), grad(v))*dx - f*v*dx == 0, u, bc)
+    J = assemble(u**4*dx)
+
+    h = Function(V)
+    h.vector()[:] = rand(V.dim())
+    g = Function(V)
+    g.vector()[:] = rand(V.dim())
+
+    compute_gradient(J, f, hessian=True)
+    H = Hessian(J, f)
+    Hh = H(h)
+
+    Hh_batch, Hg_batch = H.apply_batch([h, g])
+    assert (Hh_batch.vector() - Hh.vector()).norm("l2") < 1e-10*Hh.vector().norm("l2")
+    # The Hessian is symmetric.
+    assert abs(Hh_batch.vector().inner(g.vector()) - Hg_batch.vector().inner(h.vector())) < 1e-10
+
+
 def test_mixed_derivatives():
     tape = Tape()
     set_working_tape(tape)
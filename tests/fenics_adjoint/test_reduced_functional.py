@@ -320,3 +320,38 @@ def test_assemble_recompute():
     h.vector()[:] = 1
     assert(taylor_test(Jhat, m, h) > 1.9)
 
+
+
+@pytest.mark.parametrize("compare_outputs", [False, True])
+def test_incremental_replay(compare_outputs):
+    tape = Tape()
+    set_working_tape(tape)
+
+    a = AdjFloat(2.0)
+    b = AdjFloat(3.0)
+    c = AdjFloat(4.0)
+    x = a*b
+    y = c*c
+    J = x + y
+
+    Jhat = ReducedFunctional(J, [a, b, c], incremental=True, compare_outputs=compare_outputs)
+    blocks = tape.get_blocks()
+
+    recomputed = []
+    for block in blocks:
+        block.recompute = (lambda block, recompute: lambda: (recomputed.append(block), recompute())[1])(
+            block, block.recompute)
+
+    assert Jhat([AdjFloat(2.0), AdjFloat(3.0), AdjFloat(4.0)]) == 22.0
+    assert recomputed == []
+
+    assert Jhat([AdjFloat(2.0), AdjFloat(3.0), AdjFloat(5.0)]) == 31.0
+    assert recomputed == [blocks[1], blocks[2]]
+
+    # a*b does not change, so only the first block is recomputed when comparing outputs.
+    del recomputed[:]
+    assert Jhat([AdjFloat(3.0), AdjFloat(2.0), AdjFloat(5.0)]) == 31.0
+    if compare_outputs:
+        assert recomputed == [blocks[0]]
+    else:
+        assert recomputed == [blocks[0], blocks[2]]
@@ -468,6 +468,233 @@ def _test_adjoint_constant(J, c):
     tol = 1E-1
     assert( r[-1] > 2-tol )
 
+def test_adjoint_operator_cache():
+    from fenics_adjoint.operator_cache import get_operator_cache
+
+    mesh = UnitIntervalMesh(20)
+    V = FunctionSpace(mesh, "CG", 1)
+    u = TrialFunction(V)
+    v = TestFunction(V)
+    bc = DirichletBC(V, 0, "on_boundary")
+
+    def gradient():
+        tape = Tape()
+        set_working_tape(tape)
+        k = Constant(0.5)
+        u_ = Function(V)
+        u_1 = Function(V)
+        a = u*v*dx + 0.1*k*inner(grad(u), grad(v))*dx
+        L = (u_1 + 1)*v*dx
+        for i in range(10):
+            solve(a == L, u_, bc)
+            u_1.assign(u_)
+        J = assemble(u_**2*dx)
+        return compute_gradient(J, k)
+
+    cache = get_operator_cache()
+    maxsize = cache.maxsize
+    try:
+        cache.maxsize = 0
+        dJdk = gradient()
+
+        cache.maxsize = maxsize
+        cache.clear()
+        hits = cache.hits
+        misses = cache.misses
+        assert abs(float(gradient()) - float(dJdk)) < 1e-12*abs(float(dJdk))
+        assert cache.misses - misses == 1
+        assert cache.hits - hits == 9
+    finally:
+        cache.maxsize = maxsize
+        cache.clear()
+
+
+def test_adjoint_operator_cache_bcs():
+    import gc
+    import weakref
+    from fenics_adjoint.operator_cache import get_operator_cache
+
+    mesh = UnitIntervalMesh(20)
+    V = FunctionSpace(mesh, "CG", 1)
+    u = TrialFunction(V)
+    v = TestFunction(V)
+
+    def gradient(boundary):
+        set_working_tape(Tape())
+        bc = DirichletBC(V, 0, boundary)
+        k = Constant(0.5)
+        u_ = Function(V)
+        solve(u*v*dx + k*inner(grad(u), grad(v))*dx == v*dx, u_, bc)
+        J = assemble(u_**2*dx)
+        return float(compute_gradient(J, k)), weakref.ref(bc)
+
+    cache = get_operator_cache()
+    maxsize = cache.maxsize
+    try:
+        cache.clear()
+        _, bc = gradient("on_boundary")
+        set_working_tape(Tape())
+        gc.collect()
+        # The cached operator keeps its boundary conditions alive, so their ids are not reused.
+        assert bc() is not None
+
+        dJdk, _ = gradient("near(x[0], 0)")
+        cache.maxsize = 0
+        expected, _ = gradient("near(x[0], 0)")
+        assert abs(dJdk - expected) < 1e-12*abs(expected)
+    finally:
+        cache.maxsize = maxsize
+        cache.clear()
+
+
+@pytest.mark.parametrize("advection", [0, 1])
+def test_reuse_operator(advection):
+    mesh = UnitSquareMesh(8, 8)
+    V = FunctionSpace(mesh, "CG", 1)
+    u = TrialFunction(V)
+    v = TestFunction(V)
+    bc = DirichletBC(V, 1, "on_boundary")
+    b = Constant((1, 0.5))
+
+    def gradient(reuse_operator):
+        set_working_tape(Tape())
+        f = interpolate(Expression("x[0]*x[1]", degree=2), V)
+        f = Function(V, f.vector())
+        u_ = Function(V)
+        a = inner(grad(u), grad(v))*dx
+        if advection:
+            # Not symmetric, the adjoint uses a transpose solve.
+            a += inner(b, grad(u))*v*dx
+        A, rhs = assemble_system(a, f*v*dx, bc)
+        solve(A, u_.vector(), rhs, "lu", reuse_operator=reuse_operator)
+        J = assemble(u_**2*dx)
+        return compute_gradient(J, f)
+
+    dJdf = gradient(False)
+    dJdf_reused = gradient(True)
+    assert (dJdf.vector() - dJdf_reused.vector()).norm("l2") < 1e-10*dJdf.vector().norm("l2")
+
+
+@pytest.mark.parametrize("reuse_operator", [False, True])
+def test_iterative_linear_algebra_solve(reuse_operator):
+    mesh = UnitSquareMesh(8, 8)
+    V = FunctionSpace(mesh, "CG", 1)
+    u = TrialFunction(V)
+    v = TestFunction(V)
+    bc = DirichletBC(V, 1, "on_boundary")
+    b = Constant((1, 0.5))
+    h = interpolate(Expression("sin(x[0])", degree=2), V)
+
+    def derivatives(*method):
+        set_working_tape(Tape())
+        f = interpolate(Expression("x[0]*x[1]", degree=2), V)
+        f = Function(V, f.vector())
+        u_ = Function(V)
+        A, rhs = assemble_system(inner(grad(u), grad(v))*dx + inner(b, grad(u))*v*dx, f*v*dx, bc)
+        solve(A, u_.vector(), rhs, *method, reuse_operator=reuse_operator)
+        J = assemble(u_**4*dx)
+        dJdf = compute_gradient(J, f)
+        Hh = Hessian(J, f)(h)
+        Jf = ReducedFunctional(J, f)(f)
+        return Jf, dJdf.vector(), Hh.vector()
+
+    Jf, dJdf, Hh = derivatives("gmres", "ilu")
+    Jf_lu, dJdf_lu, Hh_lu = derivatives("lu")
+    assert abs(Jf - Jf_lu) < 1e-4*abs(Jf_lu)
+    assert (dJdf - dJdf_lu).norm("l2") < 1e-4*dJdf_lu.norm("l2")
+    assert (Hh - Hh_lu).norm("l2") < 1e-4*Hh_lu.norm("l2")
+
+
+def test_form_cache():
+    from fenics_adjoint.solving import SolveBlock
+
+    tape = Tape()
+    set_working_tape(tape)
+    mesh = UnitIntervalMesh(10)
+    V = FunctionSpace(mesh, "CG", 1)
+    u = TrialFunction(V)
+    v = TestFunction(V)
+    f = Function(V)
+    f.vector()[:] = 1
+    u_ = Function(V)
+    bc = DirichletBC(V, 1, "on_boundary")
+    solve(f*u*v*dx + inner(grad(u), grad(v))*dx == f**2*v*dx, u_, bc)
+    J = assemble(u_**2*dx)
+
+    block = [b for b in tape.get_blocks() if isinstance(b, SolveBlock)][0]
+    dJdf = compute_gradient(J, f)
+    F_form = block._forms()[0]
+    J.block_output.adj_value = None
+    assert (compute_gradient(J, f).vector() - dJdf.vector()).norm("l2") == 0
+    assert block._forms()[0] is F_form
+
+    # A replay creates new checkpoints, and the forms are derived again.
+    g = Function(V)
+    g.vector()[:] = 2
+    Jhat = ReducedFunctional(J, f)
+    Jhat(g)
+    # The forms derived from the old checkpoints are released by the replay.
+    assert block._form_cache._forms == {}
+    assert block._forms()[0] is not F_form
+    Jhat.derivative()
+    assert taylor_test(Jhat, g, Function(V, g.vector()*0.1)) > 1.9
+
+
+def test_compute_jacobian():
+    tape = Tape()
+    set_working_tape(tape)
+    mesh = UnitIntervalMesh(10)
+    V = FunctionSpace(mesh, "CG", 1)
+    u = TrialFunction(V)
+    v = TestFunction(V)
+    f = Function(V)
+    f.vector()[:] = 1
+    k = Constant(2.0)
+    u_ = Function(V)
+    bc = DirichletBC(V, 0, "on_boundary")
+    solve(k*u*v*dx + inner(grad(u), grad(v))*dx == f**2*v*dx, u_, bc)
+    Js = [assemble(u_**2*dx), assemble(f*u_*dx), assemble(k*u_*dx)]
+
+    gradients = []
+    for J in Js:
+        gradients.append(compute_gradient(J, [f, k]))
+        J.block_output.adj_value = None
+
+    jacobian = compute_jacobian(Js, [f, k])
+    assert len(jacobian) == len(Js)
+    for (dJdf, dJdk), (dJdf_batch, dJdk_batch) in zip(gradients, jacobian):
+        assert (dJdf.vector() - dJdf_batch.vector()).norm("l2") < 1e-12*dJdf.vector().norm("l2")
+        assert abs(float(dJdk) - float(dJdk_batch)) < 1e-12*abs(float(dJdk))
+
+
+def test_inactive_dependencies():
+    tape = Tape()
+    set_working_tape(tape)
+    mesh = UnitIntervalMesh(10)
+    V = FunctionSpace(mesh, "CG", 1)
+    u = TrialFunction(V)
+    v = TestFunction(V)
+    f = Function(V)
+    f.vector()[:] = 1
+    nu = Constant(0.5)
+    g = Function(V)
+    g.vector()[:] = 2
+    u_ = Function(V)
+    bc = DirichletBC(V, 0, "on_boundary")
+    solve(nu*inner(grad(u), grad(v))*dx + g*u*v*dx == f*v*dx, u_, bc)
+    J = assemble(nu*u_**2*dx)
+
+    dJdf = compute_gradient(J, f)
+    assert nu.get_adj_output() is None
+    assert g.get_adj_output() is None
+
+    J.block_output.adj_value = None
+    dJdf_all, dJdnu = compute_gradient(J, [f, nu])
+    assert (dJdf.vector() - dJdf_all.vector()).norm("l2") < 1e-12*dJdf.vector().norm("l2")
+    assert nu.get_adj_output() is not None
+    assert g.get_adj_output() is None
+
+
 def _test_adjoint(J, f):
     import numpy.random
     tape = Tape()
@@ -82,3 +82,305 @@ def test_tape_time():
         t += dt
 
     assemble(u_1**2*dx)
+
+
+def test_tape_index():
+    tape = Tape()
+    set_working_tape(tape)
+
+    a = AdjFloat(2.0)
+    b = AdjFloat(3.0)
+    c = a*b
+    d = c + a
+    e = d*c
+
+    c_bo = c.get_block_output()
+    assert tape.get_producer_index(a.get_block_output()) is None
+    assert tape.get_producer_index(c_bo) == 0
+    assert tape.get_producer_index(e.get_block_output()) == 2
+    assert tape.get_consumer_indices(a.get_block_output()) == [0, 1]
+    assert tape.get_consumer_indices(c_bo) == [1, 2]
+    assert tape.get_consumer_indices(e.get_block_output()) == []
+
+
+@pytest.mark.parametrize("snapshots", [None, 2])
+def test_pruned_gradient(snapshots):
+    tape = Tape()
+    set_working_tape(tape)
+
+    a = AdjFloat(2.0)
+    b = AdjFloat(3.0)
+    c = a*b
+    diagnostic = c*c
+    unrelated = b*b
+    J = c*a
+
+    if snapshots is not None:
+        tape.enable_checkpointing(snapshots)
+
+    J_bo = J.get_block_output()
+    assert tape.get_path_indices([a.original_block_output], J_bo) == [0, 3]
+    assert tape.get_path_indices([b.original_block_output], J_bo) == [0, 3]
+
+    g = compute_gradient(J, [a, b])
+    g_pruned = compute_gradient(J, [a, b], prune=True)
+    assert g == g_pruned
+
+    Jhat = ReducedFunctional(J, a, prune=True)
+    assert Jhat.derivative() == g[0]
+
+
+def test_tape_optimize():
+    tape = Tape()
+    set_working_tape(tape)
+
+    a = AdjFloat(2.0)
+    b = AdjFloat(3.0)
+    c = a*b
+    diagnostic = c*c
+    diagnostic = diagnostic + b
+    J = c*a
+    g = compute_gradient(J, [a, b])
+
+    assert tape.optimize([J]) == 2
+    assert len(tape.get_blocks()) == 2
+    assert diagnostic.get_block_output().checkpoint is None
+    assert compute_gradient(J, [a, b]) == g
+
+    Jhat = ReducedFunctional(J, [a, b])
+    assert Jhat([AdjFloat(3.0), AdjFloat(3.0)]) == 27.0
+
+
+def test_tape_optimize_dirichletbc():
+    tape = Tape()
+    set_working_tape(tape)
+
+    mesh = IntervalMesh(10, 0, 1)
+    V = FunctionSpace(mesh, "Lagrange", 1)
+    f = Function(V)
+    f.vector()[:] = 1
+
+    u = TrialFunction(V)
+    v = TestFunction(V)
+    u_ = Function(V)
+    bc = DirichletBC(V, 1, "on_boundary")
+    for i in range(3):
+        # Unused boundary conditions.
+        DirichletBC(V, i, "on_boundary")
+
+    solve(inner(grad(u), grad(v))*dx == f*v*dx, u_, bc)
+    J = assemble(u_**2*dx)
+
+    Jhat = ReducedFunctional(J, f)
+    dJdf = Jhat.derivative()
+
+    n = len(tape.get_blocks())
+    assert tape.optimize([J]) == 4
+    assert len(tape.get_blocks()) == n - 4
+
+    Jhat = ReducedFunctional(J, f)
+    assert (Jhat.derivative().vector() - dJdf.vector()).norm("l2") < 1e-12
+    assert taylor_test(Jhat, f, Function(V).interpolate(Constant(1))) > 1.9
+
+
+def test_tape_profiling():
+    tape = Tape()
+    set_working_tape(tape)
+
+    mesh = IntervalMesh(10, 0, 1)
+    V = FunctionSpace(mesh, "Lagrange", 1)
+    f = Function(V)
+    f.vector()[:] = 1
+
+    u = TrialFunction(V)
+    v = TestFunction(V)
+    u_ = Function(V)
+    bc = DirichletBC(V, 1, "on_boundary")
+    solve(inner(grad(u), grad(v))*dx == f*v*dx, u_, bc)
+    J = assemble(u_**2*dx)
+
+    profile = tape.enable_profiling()
+    Jhat = ReducedFunctional(J, f)
+    Jhat.derivative()
+    Jhat(f)
+
+    report = profile.report()
+    assert report["adjoint"]["calls"] == 1
+    assert report["adjoint"]["solve"] == 1
+    assert report["adjoint"]["blocks"]["SolveBlock"]["evaluate_adj"]["solve"] == 1
+    assert report["adjoint"]["blocks"]["AssembleBlock"]["evaluate_adj"]["calls"] == 1
+    assert report["replay"]["blocks"]["SolveBlock"]["recompute"]["calls"] == 1
+    assert report["replay"]["solve"] == 1
+    assert report["replay"]["time"] > 0
+    assert "SolveBlock.evaluate_adj" in str(profile)
+
+    # The second gradient solves with the factorization kept by the operator cache.
+    Jhat.derivative()
+    assert report["adjoint"]["solve"] == 2
+    assert report["adjoint"]["blocks"]["SolveBlock"]["evaluate_adj"]["solve"] == 2
+
+
+def test_tape_memory_report():
+    tape = Tape()
+    set_working_tape(tape)
+
+    mesh = IntervalMesh(10, 0, 1)
+    V = FunctionSpace(mesh, "Lagrange", 1)
+    f = Function(V)
+    f.vector()[:] = 1
+    u = Function(V)
+    for i in range(4):
+        u.assign(f)
+    J = assemble(u**2*dx)
+
+    report = tape.memory_report(block_range=2)
+    size = 11*8
+    assert report.by_block["AssignBlock"]["checkpoint"] == 4*size
+    assert report.leaves["checkpoint"] >= size
+    assert [(start, end) for start, end, _ in report.by_range] == [(0, 2), (2, 4), (4, 5)]
+    assert report.totals["adj_value"] == 0
+
+    compute_gradient(J, f)
+    assert tape.memory_report().totals["adj_value"] > 0
+
+
+@pytest.mark.parametrize("threads", [1, 4])
+def test_parallel_reverse_sweep(threads):
+    def model():
+        a = AdjFloat(1.1)
+        b = AdjFloat(0.7)
+        x = a
+        J = 0
+        for i in range(10):
+            x = x*b + a
+            J = J + x*x + b*a
+        return J, a, b
+
+    set_working_tape(Tape())
+    J, a, b = model()
+    g = compute_gradient(J, [a, b])
+
+    tape = Tape()
+    set_working_tape(tape)
+    J, a, b = model()
+    assert compute_gradient(J, [a, b], threads=threads) == g
+    assert compute_gradient(J, [a, b], threads=threads, prune=True) == g
+
+    profile = tape.enable_profiling()
+    compute_gradient(J, [a, b], threads=threads)
+    blocks = profile.report()["adjoint"]["blocks"]
+    assert sum(methods["evaluate_adj"]["calls"] for methods in blocks.values()) == len(tape.get_blocks())
+
+    from pyadjoint.parallel import reverse_levels
+    levels = reverse_levels(tape, range(len(tape.get_blocks())))
+    assert len(levels) < len(tape.get_blocks())
+
+
+def test_parallel_reverse_sweep_shared_operator():
+    from fenics_adjoint.solving import SolveBlock
+    from pyadjoint.parallel import reverse_levels
+
+    mesh = UnitIntervalMesh(20)
+    V = FunctionSpace(mesh, "CG", 1)
+    u = TrialFunction(V)
+    v = TestFunction(V)
+    bc = DirichletBC(V, 0, "on_boundary")
+
+    def model():
+        k = Constant(0.5)
+        a = u*v*dx + k*inner(grad(u), grad(v))*dx
+        J = 0
+        for i in range(1, 5):
+            # The solves are independent and have the same operator.
+            u_ = Function(V)
+            solve(a == Constant(i)*v*dx, u_, bc)
+            J += assemble(u_**2*dx)
+        return J, k
+
+    set_working_tape(Tape())
+    J, k = model()
+    dJdk = float(compute_gradient(J, k))
+
+    tape = Tape()
+    set_working_tape(tape)
+    J, k = model()
+    blocks = tape.get_blocks()
+    solves = [i for i, block in enumerate(blocks) if isinstance(block, SolveBlock)]
+    levels = reverse_levels(tape, range(len(blocks)))
+    assert any(len(set(level) & set(solves)) > 1 for level in levels)
+    assert abs(float(compute_gradient(J, k, threads=4)) - dJdk) < 1e-12*abs(dJdk)
+
+
+def test_thread_local_tapes():
+    import threading
+    from pyadjoint.tape import stop_annotating
+    main_tape = Tape()
+    set_working_tape(main_tape)
+
+    results = {}
+
+    def model(k):
+        with Tape().recording() as tape:
+            assert get_working_tape() is tape
+            a = AdjFloat(k)
+            x = a
+            for i in range(100):
+                x = x*a
+            results[k] = (len(tape.get_blocks()), compute_gradient(x, a))
+        assert get_working_tape() is main_tape
+
+    threads = [threading.Thread(target=model, args=(k,)) for k in range(1, 5)]
+    with stop_annotating():
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert len(main_tape.get_blocks()) == 0
+    for k in range(1, 5):
+        n, dJda = results[k]
+        assert n == 100
+        assert abs(dJda - 101*k**100) < 1e-12*101*k**100
+
+
+def test_paused_annotation_bookkeeping():
+    from pyadjoint.tape import stop_annotating
+    tape = Tape()
+    set_working_tape(tape)
+
+    mesh = UnitIntervalMesh(10)
+    V = FunctionSpace(mesh, "Lagrange", 1)
+    with stop_annotating():
+        f = Function(V)
+        f.vector()[:] = 2
+        c = Constant(3.0)
+        bc = DirichletBC(V, c, "on_boundary")
+        u_ = Function(V)
+        e = Expression("x[0]", degree=1)
+
+        u = TrialFunction(V)
+        v = TestFunction(V)
+        solve(u*v*dx == c*f*v*dx, u_, bc)
+    assert len(tape.get_blocks()) == 0
+    for obj in (f, c, bc, u_, e):
+        assert "block_output" not in obj.__dict__
+        assert obj.tape is tape
+
+    # The objects are annotated as usual once annotation is turned back on.
+    J = assemble(c*f**2*dx)
+    dJdc = compute_gradient(J, c)
+    assert abs(float(dJdc) - 4.0) < 1e-12
+
+    # The block output of an Expression is created on first use as well.
+    J = assemble(c*e*dx)
+    assert e.get_block_output() is e.original_block_output
+    dJdc = compute_gradient(J, c)
+    assert abs(float(dJdc) - 0.5) < 1e-12
+
+    # Vectors obtained while annotation is off can be solved for once it is back on.
+    with stop_annotating():
+        x = u_.vector()
+    A = assemble(u*v*dx)
+    b = assemble(f*v*dx)
+    solve(A, x, b)
+    assert tape.get_blocks()[-1].get_outputs()[0].output is u_
@@ -339,6 +339,33 @@ def test_assemble_recompute():
     assert (taylor_test(Jhat, g, h, dJdm=J.block_output.tlm_value) > 1.9)
 
 
+def test_jacobian_action():
+    tape = Tape()
+    set_working_tape(tape)
+    mesh = IntervalMesh(10, 0, 1)
+    V = FunctionSpace(mesh, "Lagrange", 1)
+    f = Function(V)
+    f.vector()[:] = 5
+    c = Constant(2)
 
-
-
+    u = TrialFunction(V)
+    v = TestFunction(V)
+    u_ = Function(V)
+    bc = DirichletBC(V, 1, "on_boundary")
+    solve(c*u*v*dx + inner(grad(u), grad(v))*dx == f*v*dx, u_, bc)
+
+    Js = [assemble(u_**2*dx), assemble(c*u_*dx)]
+
+    hs = []
+    for i in range(3):
+        h = Function(V)
+        h.vector()[:] = rand(V.dim())
+        hs.append([h, Constant(rand())])
+
+    jacobian_action = compute_jacobian_action(Js, [f, c], hs)
+    for J, actions in zip(Js, jacobian_action):
+        dJdm = compute_gradient(J, [f, c])
+        J.block_output.adj_value = None
+        for (h, dc), action in zip(hs, actions):
+            expected = dJdm[0].vector().inner(h.vector()) + float(dJdm[1])*float(dc)
+            assert abs(float(action) - expected) < tol*max(1, abs(expected))